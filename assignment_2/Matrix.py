@@ -1,24 +1,273 @@
+import ast
+import atexit
+import mmap
+import os
+import struct
+import sys
+import weakref
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import repeat
+from multiprocessing import shared_memory
+from operator import add, mul, neg, sub, truediv
+
+try:
+    import numpy as np
+except ImportError:  # pure Python kernels are used instead
+    np = None
+
+try:
+    from math import sumprod as _sumprod
+except ImportError:  # Python < 3.12
+    def _sumprod(p, q):
+        return sum(map(mul, p, q))
+
+# below this number of multiplications conversion to numpy costs more than it saves
+NUMPY_MIN_FLOPS = 4096
+# > 0 inside `lazy` block: arithmetic on Matrix builds LazyExpr
+_lazy_depth = 0
+# AllocationStats of active `instrument` blocks
+_instruments = []
+# bytes taken by a float in a list: pointer + object
+_BOXED_FLOAT = 8 + float().__sizeof__()
+# buffers of matrices with enabled cache: id(buf) -> [number of writes, number of such matrices]
+_buffer_versions = {}
+# binary format is .npy: magic, version, header length, header dict, raw data
+_NPY_MAGIC = b'\x93NUMPY'
+_NATIVE_ORDER = '<' if sys.byteorder == 'little' else '>'
+# .npy dtype kind and item size: array typecode
+_NPY_TYPECODES = {('f', 8): 'd', ('f', 4): 'f', ('i', 1): 'b', ('i', 2): 'h', ('i', 4): 'i', ('i', 8): 'q',
+                  ('u', 1): 'B', ('u', 2): 'H', ('u', 4): 'I', ('u', 8): 'Q', ('b', 1): 'B'}
+_MMAP_ACCESS = {'r': (mmap.ACCESS_READ, 'rb'), 'r+': (mmap.ACCESS_WRITE, 'r+b'), 'c': (mmap.ACCESS_COPY, 'rb')}
+
+
+def _record(op, matrices=0, elements=0, nbytes=0, validations=0):
+    """
+    Add counts of an operation to every active `instrument` block
+    :param op: operation type
+    :param matrices: Matrix objects created
+    :param elements: elements copied
+    :param nbytes: bytes allocated
+    :param validations: passes of value validation
+    :return:
+    """
+    for stats in _instruments:
+        stats.add(op, matrices, elements, nbytes, validations)
+
+
+def _item_bytes(buf):
+    """
+    Bytes taken by one element of the buffer
+    :param buf: array('d'), memoryview or list of complex
+    :return:
+    """
+    return 8 + complex().__sizeof__() if type(buf) is list else 8
+
+
+def _shares_memory(a, b):
+    """
+    Whether two buffers may overlap: the same object, or memoryviews on the
+    same memory (an ndarray operand and a matrix made by `from_buffer`)
+    :param a: array('d'), memoryview or list of complex
+    :param b: array('d'), memoryview or list of complex
+    :return: bool
+    """
+    if a is b:
+        return True
+    if type(a) is list or type(b) is list or memoryview not in (type(a), type(b)):
+        return False  # lists and arrays own their memory
+    if np is None:
+        return getattr(a, 'obj', a) is getattr(b, 'obj', b)
+    return np.may_share_memory(np.frombuffer(a, np.uint8), np.frombuffer(b, np.uint8))
+
+
+def _touch(buf):
+    """
+    Count a write to buf, outdating results cached by matrices on it
+    :param buf:
+    :return:
+    """
+    entry = _buffer_versions.get(id(buf))
+    if entry is not None:
+        entry[0] += 1
+
+
+def _release_version(key):
+    """
+    Forget write counter of a buffer when the last caching matrix on it is gone
+    :param key: id of the buffer
+    :return:
+    """
+    entry = _buffer_versions[key]
+    entry[1] -= 1
+    if not entry[1]:
+        del _buffer_versions[key]
+
+
+class _SharedBlock(shared_memory.SharedMemory):
+    """
+    SharedMemory which may be garbage collected while matrices view its buffer
+    """
+    def __del__(self):
+        try:
+            self.close()
+        except BufferError:  # matrices still view the block, mapping goes away with them
+            pass
+
+
+# shared memory blocks mapped by this process: id of their mmap -> [block, number of buffers viewing it]
+_shared_blocks = {}
+# name of a block created by this process -> pid of the creator (forked children inherit the dict)
+_shared_owners = {}
+
+
+def _find_block(name):
+    """
+    Block of shared memory with given name mapped by this process
+    :param name:
+    :return: _SharedBlock or None
+    """
+    return next((shm for shm, _ in _shared_blocks.values() if shm.name == name), None)
+
+
+def _shared_buffer(shm, size):
+    """
+    Buffer of doubles viewing a block of shared memory. The block is kept
+    mapped as long as such buffers (so matrices on them) are alive
+    :param shm: _SharedBlock
+    :param size: number of doubles
+    :return: memoryview
+    """
+    key = id(shm.buf.obj)
+    _shared_blocks.setdefault(key, [shm, 0])[1] += 1
+    buf = memoryview(shm.buf)[:8 * size].cast('d')
+    weakref.finalize(buf, _release_block, key)
+    return buf
+
+
+def _release_block(key):
+    """
+    Forget a block of shared memory when the last buffer on it is gone, the
+    block then closes its mapping
+    :param key: id of the mmap of the block
+    :return:
+    """
+    entry = _shared_blocks[key]
+    entry[1] -= 1
+    if not entry[1]:
+        del _shared_blocks[key]
+
+
+def _unlink_block(name):
+    """
+    Remove the name of shared memory block
+    :param name:
+    :return:
+    """
+    _shared_owners.pop(name, None)
+    try:
+        (_find_block(name) or _SharedBlock(name)).unlink()
+    except FileNotFoundError:  # already unlinked
+        pass
+
+
+@atexit.register
+def _unlink_shared():
+    """
+    Remove names of shared memory blocks created by this process
+    :return:
+    """
+    for name, pid in list(_shared_owners.items()):
+        if pid == os.getpid():
+            _unlink_block(name)
+
+
+class SharedHandle(namedtuple('SharedHandle', ['name', 'shape', 'strides', 'offset'])):
+    """
+    Reference to a Matrix (or its view) in shared memory, see `Matrix.to_shared`.
+    Pickles to the name of the block and the layout of the view, so it can be
+    sent to worker processes, which `attach` it without copying
+    """
+    __slots__ = ()
+
+    def attach(self):
+        """
+        Matrix viewing the shared memory (block is mapped once per process)
+        :return: Matrix
+        """
+        shm = _find_block(self.name)
+        if shm is None:
+            try:  # only the creator should unlink the block at exit
+                shm = _SharedBlock(self.name, track=False)
+            except TypeError:  # Python < 3.13 can't opt out of resource tracking
+                shm = _SharedBlock(self.name)
+        buf = _shared_buffer(shm, len(shm.buf) // 8)
+        if _instruments:
+            _record('view', 1)
+        return Matrix._view(buf, tuple(self.shape), tuple(self.strides), self.offset)
+
+    def unlink(self):
+        """
+        Remove the name of the block: no new process can attach it, memory is
+        freed once all processes drop their matrices. Done automatically when
+        the creating process exits.
+        :return:
+        """
+        _unlink_block(self.name)
+
+
 class Matrix(object):
+    _cache = None  # {key: (version of the buffer, value)} after `enable_cache`
+
     def __init__(self, values=None):
         """
-        Matrix is a rectangular table of numerical values
-        :param values:
+        Matrix is a rectangular table of numerical values.
+
+        Elements are kept row-major in one contiguous typed buffer (complex
+        values fall back to a plain list), addressed through shape, strides
+        and offset. Slices, rows and transpose are views sharing that buffer,
+        use `copy` to get an independent matrix.
+        :param values: list of lists
         """
         self.shape = None
-        self._validate_values(values)
-        self.values = values
+        is_complex = self._validate_values(values)
+        flat = [val for row in values for val in row] if self.shape[0] else []
+        self._buf = flat if is_complex else array('d', flat)
+        self._offset = 0
+        self._strides = (self.shape[1], 1)
+        if _instruments:
+            _record('construct', 1, len(flat), len(flat) * _item_bytes(self._buf), 1)
+
+    @classmethod
+    def _view(cls, buf, shape, strides, offset=0):
+        """
+        Create Matrix on top of existing buffer, without copying or validation
+        :param buf: flat buffer of elements
+        :param shape: (nrow, ncol)
+        :param strides: step in buffer to the next row and to the next column
+        :param offset: position of the [0, 0] element in buffer
+        :return: Matrix sharing <buf>
+        """
+        M = cls.__new__(cls)
+        M._buf = buf
+        M.shape = shape
+        M._strides = strides
+        M._offset = offset
+        return M
 
     def _validate_values(self, values):
         """
         Validate list of lists to be of correct format
         :param values:
-        :return:
+        :return: whether values contain complex numbers
         """
         prev_len = -1
         i = j = -1
+        is_complex = False
         if values is None or len(values) == 0:
             self.shape = 0, 0
-            return
+            return is_complex
         for i, row in enumerate(values):
             if prev_len == -1:
                 prev_len = len(row)
@@ -27,37 +276,389 @@ class Matrix(object):
             for j, val in enumerate(row):
                 if type(val) not in (int, float, complex):
                     raise ValueError(f"[{i}, {j}]: {val} is of bad type ({type(val)})")
+                if type(val) is complex:
+                    is_complex = True
         if i == -1:
             self.shape = 0, 0
         else:
-            self.shape = i + 1, j + 1
+            self.shape = i + 1, prev_len
+        return is_complex
+
+    @classmethod
+    def from_buffer(cls, obj, shape=None):
+        """
+        Matrix sharing memory with <obj>, without copying: writes to one are
+        visible in the other
+        :param obj: C-contiguous buffer of doubles (np.ndarray, array('d'))
+            or raw bytes (bytearray, mmap)
+        :param shape: (nrow, ncol), by default shape of 2-d obj, row vector otherwise
+        :return: Matrix
+        """
+        mv = memoryview(obj)
+        if mv.format not in ('d', 'B', 'b', 'c'):
+            raise ValueError(f"Expected buffer of doubles or bytes, got format `{mv.format}`")
+        if not mv.c_contiguous:
+            raise ValueError("Buffer is not C-contiguous")
+        buf = mv.cast('B').cast('d')
+        if shape is None:
+            shape = tuple(mv.shape) if mv.format == 'd' and mv.ndim == 2 else (1, len(buf))
+        nrow, ncol = shape
+        if nrow * ncol != len(buf):
+            raise ValueError(f"Buffer of {len(buf)} elements doesn't fit shape {shape}")
+        if _instruments:
+            _record('from_buffer', 1)
+        return cls._view(buf, (nrow, ncol), (ncol, 1))
+
+    def enable_cache(self):
+        """
+        Memoize derived results of this matrix (`max`, `argmax`, `rank`, LU
+        factors and inverse in gauss.py): repeated queries cost O(1) until the
+        matrix is changed. Every write through `__setitem__`, in-place operators
+        or `axpy` of this matrix or any of its views invalidates the results.
+        Writes bypassing Matrix (through np.asarray(M), a shared memory handle
+        or a file mapped by `load`) are not seen.
+        :return: self
+        """
+        if self._cache is None:
+            key = id(self._buf)
+            _buffer_versions.setdefault(key, [0, 0])[1] += 1
+            weakref.finalize(self, _release_version, key)
+            self._cache = {}
+        return self
+
+    def memo(self, key, compute):
+        """
+        Value of compute(), cached under <key> while the matrix is unchanged
+        (computed every time unless `enable_cache` was called)
+        :param key: hashable
+        :param compute: function without arguments
+        :return:
+        """
+        if self._cache is None:
+            return compute()
+        version = _buffer_versions[id(self._buf)][0]
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        value = compute()
+        self._cache[key] = version, value
+        return value
+
+    def to_shared(self):
+        """
+        Copy of the matrix in a new block of shared memory. `handle` of it or
+        of any of its views pickles to a few bytes, worker processes `attach` the
+        same memory and may write disjoint parts of it. The block is unlinked
+        when this process exits.
+        :return: Matrix
+        """
+        if type(self._buf) is list:
+            raise ValueError("Complex Matrix can't be placed in shared memory")
+        nrow, ncol = self.shape
+        shm = _SharedBlock(create=True, size=max(8 * nrow * ncol, 1))
+        _shared_owners[shm.name] = os.getpid()
+        M = Matrix._view(_shared_buffer(shm, nrow * ncol), self.shape, (ncol, 1))
+        for r in range(nrow):
+            M._buf[r * ncol:(r + 1) * ncol] = array('d', self._row(r))
+        if _instruments:
+            _record('to_shared', 1, nrow * ncol, nrow * ncol * 8)
+        return M
+
+    @property
+    def handle(self):
+        """
+        Picklable reference to this shared memory matrix
+        :return: SharedHandle
+        """
+        entry = _shared_blocks.get(id(getattr(self._buf, 'obj', None)))
+        if entry is None:
+            raise ValueError("Matrix is not in shared memory, see `to_shared`")
+        return SharedHandle(entry[0].name, self.shape, self._strides, self._offset)
+
+    def save(self, file):
+        """
+        Write matrix in binary .npy format (also readable by np.load): small
+        header with dtype, byte order and shape, then raw elements row-major
+        :param file: path or binary file object
+        :return:
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'wb') as f:
+                return self.save(f)
+        nrow, ncol = self.shape
+        is_complex = type(self._buf) is list
+        descr = _NATIVE_ORDER + ('c16' if is_complex else 'f8')
+        header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({nrow}, {ncol}), }}"
+        header += ' ' * (-(len(_NPY_MAGIC) + 4 + len(header) + 1) % 64) + '\n'  # data aligned to 64 bytes
+        file.write(_NPY_MAGIC + b'\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1'))
+        if is_complex:
+            for r in range(nrow):
+                file.write(array('d', [part for val in self._row(r) for part in (val.real, val.imag)]))
+        elif self._is_contiguous():
+            file.write(memoryview(self._buf)[self._offset:self._offset + nrow * ncol])
+        else:
+            for r in range(nrow):
+                file.write(array('d', self._row(r)))
+
+    @classmethod
+    def load(cls, file, mmap_mode='r'):
+        """
+        Read matrix written by `save` or np.save. Native float64 data is
+        memory-mapped: loading takes O(1) and pages are read when accessed.
+        Other dtypes and byte orders are converted in memory.
+        :param file: path or binary file object
+        :param mmap_mode: 'r' read-only, 'r+' writes go to the file, 'c' copy-on-write,
+            None to read the data into memory
+        :return: Matrix (1-d array becomes a row)
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'rb' if mmap_mode is None else _MMAP_ACCESS[mmap_mode][1]) as f:
+                return cls.load(f, mmap_mode)
+        start = file.tell()
+        if file.read(len(_NPY_MAGIC)) != _NPY_MAGIC:
+            raise ValueError("Not a .npy file")
+        major = file.read(2)[0]
+        size_format = '<H' if major == 1 else '<I'
+        header_len, = struct.unpack(size_format, file.read(struct.calcsize(size_format)))
+        header = ast.literal_eval(file.read(header_len).decode('utf8' if major >= 3 else 'latin1'))
+        descr, shape = header['descr'], header['shape']
+        if len(shape) > 2 or not isinstance(descr, str):
+            raise ValueError(f"Can't load array of shape {shape} and dtype {descr} into Matrix")
+        shape = (tuple(shape) + (1, 1))[:2] if len(shape) != 1 else (1, shape[0])
+        if header['fortran_order']:
+            shape = shape[::-1]
+        order, kind, itemsize = descr[0], descr[1], int(descr[2:])
+        n = shape[0] * shape[1]
+        offset = file.tell() - start
+        if (kind, itemsize) == ('f', 8) and order in ('=', _NATIVE_ORDER) and mmap_mode is not None:
+            mm = mmap.mmap(file.fileno(), 0, access=_MMAP_ACCESS[mmap_mode][0])
+            buf = memoryview(mm)[start + offset:start + offset + 8 * n].cast('d')
+        else:
+            data = file.read(n * itemsize)
+            if kind == 'c':
+                parts = array('d' if itemsize == 16 else 'f', data)
+                if order not in ('=', '|', _NATIVE_ORDER):
+                    parts.byteswap()
+                buf = [complex(re, im) for re, im in zip(parts[::2], parts[1::2])]
+            elif (kind, itemsize) in _NPY_TYPECODES:
+                items = array(_NPY_TYPECODES[kind, itemsize], data)
+                if order not in ('=', '|', _NATIVE_ORDER):
+                    items.byteswap()
+                buf = items if items.typecode == 'd' else array('d', items)
+            else:
+                raise ValueError(f"Can't load array of dtype {descr} into Matrix")
+        if _instruments:
+            copied = 0 if type(buf) is memoryview else n
+            _record('load', 1, copied, copied * _item_bytes(buf))
+        M = cls._view(buf, shape, (shape[1], 1))
+        return M.T if header['fortran_order'] else M
+
+    def __array__(self, dtype=None, copy=None):
+        """
+        Conversion to numpy array, sharing memory unless a copy is required
+        :param dtype:
+        :param copy:
+        :return: np.ndarray
+        """
+        if type(self._buf) is list:
+            arr = np.array(self.values, dtype=dtype)
+        else:
+            arr = self._ndarray()
+            if dtype is not None:
+                arr = arr.astype(dtype, copy=False)
+        return arr.copy() if copy else arr
+
+    @property
+    def __array_interface__(self):
+        """
+        numpy array interface, lets np.asarray(M) view the buffer directly
+        :return: dict
+        """
+        if np is None or type(self._buf) is list:
+            raise AttributeError("Only real Matrix exposes __array_interface__ (requires numpy)")
+        return self._ndarray().__array_interface__
+
+    def __buffer__(self, flags):
+        """
+        Buffer protocol (Python 3.12+): contiguous matrix is exported as
+        2-d memoryview of doubles
+        :param flags:
+        :return: memoryview
+        """
+        if type(self._buf) is list or not self._is_contiguous():
+            raise BufferError("Only contiguous real Matrix supports buffer protocol")
+        nrow, ncol = self.shape
+        flat = memoryview(self._buf)[self._offset:self._offset + nrow * ncol]
+        return flat.cast('B').cast('d', self.shape)
+
+    def _is_contiguous(self):
+        """
+        Whether elements are stored row-major without gaps
+        :return:
+        """
+        nrow, ncol = self.shape
+        return (self._strides[1] == 1 or ncol <= 1) and (self._strides[0] == ncol or nrow <= 1)
+
+    @property
+    def values(self):
+        """
+        Elements of the matrix as list of lists (always a copy)
+        :return:
+        """
+        if _instruments:
+            n = self.shape[0] * self.shape[1]
+            _record('values', 0, n, n * _BOXED_FLOAT)
+        return [self._row(r) for r in range(self.shape[0])]
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes occupied by elements of the matrix
+        :return:
+        """
+        n = self.shape[0] * self.shape[1]
+        if type(self._buf) is list:  # boxed complex: pointer + object
+            return n * (8 + complex().__sizeof__())
+        return n * self._buf.itemsize
+
+    def _row_slice(self, r):
+        """
+        Slice of the buffer holding r-th row
+        :param r: row index (non-negative)
+        :return: slice
+        """
+        start = self._offset + r * self._strides[0]
+        step = self._strides[1]
+        stop = start + self.shape[1] * step
+        if stop < 0:  # negative step reaching the beginning of the buffer
+            stop = None
+        return slice(start, stop, step)
+
+    def _row(self, r):
+        """
+        Elements of r-th row as a list
+        :param r: row index (non-negative)
+        :return:
+        """
+        if self.shape[1] == 0:
+            return []
+        if _instruments:
+            _record('row', 0, self.shape[1], self.shape[1] * _BOXED_FLOAT)
+        return list(self._buf[self._row_slice(r)])
+
+    def _index(self, r, c):
+        """
+        Position of element [r, c] in the buffer, negative indices allowed
+        :param r:
+        :param c:
+        :return:
+        """
+        nrow, ncol = self.shape
+        if r < 0:
+            r += nrow
+        if c < 0:
+            c += ncol
+        if not (0 <= r < nrow and 0 <= c < ncol):
+            raise IndexError(f"Index [{r}, {c}] is out of bounds for shape {self.shape}")
+        return self._offset + r * self._strides[0] + c * self._strides[1]
+
+    @staticmethod
+    def _axis_range(key, n):
+        """
+        Resolve integer or slice along the axis of length n
+        :param key: int or slice
+        :param n: length of the axis
+        :return: (start, length, step)
+        """
+        if type(key) is int:
+            if key < 0:
+                key += n
+            if not 0 <= key < n:
+                raise IndexError(f"Index {key} is out of bounds for axis of length {n}")
+            return key, 1, 1
+        start, stop, step = key.indices(n)
+        return start, len(range(start, stop, step)), step
+
+    def _subview(self, row, col):
+        """
+        View on rows <row> and columns <col>, integer index keeps its axis
+        :param row: int or slice
+        :param col: int or slice
+        :return: Matrix sharing the buffer
+        """
+        r0, nrow, r_step = self._axis_range(row, self.shape[0])
+        c0, ncol, c_step = self._axis_range(col, self.shape[1])
+        r_stride, c_stride = self._strides
+        if _instruments:
+            _record('view', 1)
+        return Matrix._view(self._buf, (nrow, ncol),
+                            (r_stride * r_step, c_stride * c_step),
+                            self._offset + r0 * r_stride + c0 * c_stride)
+
+    def copy(self):
+        """
+        Copy of the matrix, backed by its own contiguous buffer
+        :return: Matrix
+        """
+        nrow, ncol = self.shape
+        if self._is_contiguous():
+            flat = self._buf[self._offset:self._offset + nrow * ncol]
+        else:
+            flat = [val for r in range(nrow) for val in self._row(r)]
+        if type(self._buf) is list:
+            buf = list(flat)
+        elif type(flat) is array:  # slice of an array is already a copy
+            buf = flat
+        elif type(flat) is memoryview:  # slice of a memoryview is not
+            buf = array('d', flat.tobytes())
+        else:
+            buf = array('d', flat)
+        if _instruments:
+            _record('copy', 1, len(buf), len(buf) * _item_bytes(buf))
+        return Matrix._view(buf, self.shape, (ncol, 1))
 
     def __repr__(self):
-        if self.values:
-            return '\n'.join([str(row) for row in self.values])
+        values = self.values
+        if values:
+            return '\n'.join([str(row) for row in values])
+        else:
+            return str(values)
+
+    def __iter__(self):
+        """
+        Iterate over elements of a vector, or over rows of a matrix
+        :return:
+        """
+        nrow, ncol = self.shape
+        if nrow == 1:
+            yield from self._row(0)
+        elif ncol == 1:
+            yield from self.T._row(0)
         else:
-            return str(self.values)
+            for r in range(nrow):
+                yield self._subview(r, slice(None))
 
     def __getitem__(self, item):
         """
-        A[key] -- access by indexing
+        A[key] -- access by indexing.
+        Slices and rows are views on the same buffer, list of rows is a copy
         :param item:
         :return:
         """
         if type(item) is int:
             #  select row by default
             if self.shape[0] == 1:  # iterate by column if it's a row vector
-                return self.values[0][item]
+                return self._buf[self._index(0, item)]
             elif self.shape[1] == 1:  # iterate by row if it's a column vector
-                return self.values[item][0]
-            return Matrix([self.values[item]])
+                return self._buf[self._index(item, 0)]
+            return self._subview(item, slice(None))
         elif type(item) is list:
-            return Matrix([self.values[i] for i in item])
+            return Matrix([self._subview(i, slice(None))._row(0) for i in item])
         elif type(item) is tuple and len(item) == 2 and type(item[0]) is int and type(item[1]) is int:
             r, c = item
-            return self.values[r][c]
+            return self._buf[self._index(r, c)]
         elif type(item) is slice:
-            return Matrix(self.values[item])
+            return self._subview(item, slice(None))
         else:
             for i in item:
                 if type(i) not in (int, slice):
@@ -67,85 +668,238 @@ class Matrix(object):
             if self.shape == (0, 0):
                 return Matrix([[]])
             row_slice, col_slice = item
-            rows = self.values[row_slice]  # M[0, :] to work
-            if type(rows[0]) is not list:
-                rows = [rows]
-            subset = [row[col_slice] for row in rows]
-            if type(subset) in (int, float, complex):
-                return Matrix([[subset]])
-            elif type(subset) in (list, tuple) and type(subset[0]) in (int, float, complex):
-                return Matrix([subset])
-            else:
-                return Matrix(subset)
+            view = self._subview(row_slice, col_slice)
+            if type(col_slice) is int:  # M[:, 0] is a row vector
+                return view.T
+            return view
 
     def __setitem__(self, key, value):
         """
         A[key] = value
+        Value is either a scalar, a Matrix (or sequence) of the same shape,
+        or a row to be repeated over every selected row
         :param key:
         :param value:
         :return:
         """
+        _touch(self._buf)
         if type(key) is int:
             row = key
             col = slice(None, None, None)
         else:
             row, col = key
-        if type(row) is int:
-            row_it = range(row, row + 1)
+        if type(row) is int and type(col) is int:
+            self._buf[self._index(row, col)] = value
+            return
+        target = self._subview(row, col)
+        if type(col) is int:
+            target = target.T
+        target._assign(value)
+
+    def _assign(self, value):
+        """
+        Write value into every element of this (possibly strided) view
+        :param value: scalar, Matrix or sequence
+        :return:
+        """
+        nrow, ncol = self.shape
+        if isinstance(value, LazyExpr):
+            value.evaluate(out=self)  # written straight into the view
+            return
+        if isinstance(value, Matrix):
+            if (value._buf is self._buf and value._offset == self._offset
+                    and value._strides == self._strides and value.shape == self.shape):
+                return  # A[i, :] op= B leaves the view assigned onto itself
+            rows = value.values
+        elif not hasattr(value, '__len__'):  # scalar
+            rows = [[value] * ncol] * nrow
         else:
-            row_it = range(*row.indices(len(self.values)))
-        for r in row_it:
-            if type(col) is int:
-                self.values[r][col] = value
-            else:
-                for c in range(*col.indices(len(self.values[0]))):
-                    self.values[r][c] = value[c]
+            rows = [list(row) if hasattr(row, '__len__') else row for row in value]
+            if rows and not hasattr(value[0], '__len__'):
+                rows = [rows]
+        if len(rows) == 1 and nrow != 1:
+            rows = rows * nrow
+        if len(rows) != nrow or any(len(row) != ncol for row in rows):
+            raise ValueError(f"Can't assign value of different shape to {self.shape} view")
+        r_stride, c_stride = self._strides
+        buf = self._buf
+        for r, row in enumerate(rows):
+            pos = self._offset + r * r_stride
+            for val in row:
+                buf[pos] = val
+                pos += c_stride
+
+    @staticmethod
+    def _operand(other):
+        """
+        Wrap array-like operand of arithmetic into Matrix (zero-copy for
+        float64 arrays), 1-d sequence becomes a row vector
+        :param other: scalar, Matrix, LazyExpr (computed), np.ndarray or list
+        :return: scalar or Matrix
+        """
+        if isinstance(other, Matrix):
+            return other
+        if isinstance(other, LazyExpr):
+            return other.evaluate()
+        if not hasattr(other, '__len__'):
+            return other
+        if np is not None and isinstance(other, np.ndarray):
+            if other.dtype == np.float64 and other.flags.c_contiguous and other.ndim <= 2:
+                return Matrix.from_buffer(other)
+            other = other.tolist()
+        rows = [list(row) if hasattr(row, '__len__') else row for row in other]
+        if rows and not hasattr(rows[0], '__len__'):
+            rows = [rows]
+        return Matrix(rows)
+
+    @staticmethod
+    def _broadcast_shape(shapes):
+        """
+        Shape of the result of elementwise operation by numpy broadcasting
+        rules: axis of length 1 is repeated along the other operands
+        :param shapes: shapes of matrix operands
+        :return: (nrow, ncol)
+        """
+        shape = []
+        for axis in (0, 1):
+            dims = {s[axis] for s in shapes} - {1}
+            if len(dims) > 1:
+                raise ValueError(f"Can't broadcast shapes {list(shapes)}")
+            shape.append(dims.pop() if dims else 1)
+        return tuple(shape)
+
+    @staticmethod
+    def _elementwise(op, operands, out=None):
+        """
+        Elementwise operation result[i, j] = op(x[i, j], y[i, j], ...)
+        In lazy mode (see `lazy`) builds LazyExpr instead of computing, and
+        lazy operands are fused into a single pass.
+        :param op: function of len(operands) arguments
+        :param operands: scalars, Matrix objects, LazyExpr or array-likes
+        :param out: Matrix to write the result into (in-place operation)
+        :return: Matrix (out, if given) or LazyExpr
+        """
+        if out is None and _lazy_depth:
+            return LazyExpr(op, operands)
+        if any(isinstance(x, LazyExpr) for x in operands):
+            return LazyExpr(op, operands).evaluate(out=out)
+        return Matrix._map_rows(op, operands, out=out)
+
+    @staticmethod
+    def _map_rows(op, operands, out=None):
+        """
+        Broadcasting elementwise kernel. How each operand is read is decided
+        once per operation, then whole rows are pushed through `map`
+        :param op: function of len(operands) arguments
+        :param operands: scalars, Matrix objects or array-likes
+        :param out: Matrix to write the result into
+        :return: Matrix (out, if given)
+        """
+        operands = [Matrix._operand(x) for x in operands]
+        nrow, ncol = Matrix._broadcast_shape([x.shape for x in operands if isinstance(x, Matrix)])
+        if out is not None and out.shape != (nrow, ncol):
+            raise ValueError(f"Can't write result of shape {(nrow, ncol)} into {out.shape}")
+        is_complex = any(type(x._buf) is list if isinstance(x, Matrix) else type(x) is complex
+                         for x in operands)
+
+        def reader(x):
+            """Function returning iterable over elements of x in r-th row of result"""
+            if not isinstance(x, Matrix):
+                row = [x] * ncol
+                return lambda r: row
+            if out is not None and nrow > 1 and (
+                    (x._offset, x._strides, x.shape) != (out._offset, out._strides, out.shape)
+                    if x._buf is out._buf else _shares_memory(x._buf, out._buf)):
+                x = x.copy()  # rows written first may be read later
+            buf = x._buf
+            if x.shape[0] == 1:  # same row for every row of the result
+                row = buf[x._row_slice(0)] if x.shape[1] == ncol else [buf[x._offset]] * ncol
+                return lambda r: row
+            if x.shape[1] == ncol:
+                return lambda r: buf[x._row_slice(r)]
+            return lambda r: [buf[x._offset + r * x._strides[0]]] * ncol
+
+        readers = [reader(x) for x in operands]
+        if out is None:
+            flat = [] if is_complex else array('d')
+            for r in range(nrow):
+                flat.extend(map(op, *[read(r) for read in readers]))
+            if _instruments:
+                _record('elementwise', 1, len(flat), len(flat) * _item_bytes(flat))
+            return Matrix._view(flat, (nrow, ncol), (ncol, 1))
+        buf = out._buf
+        _touch(buf)
+        if _instruments:  # every row is computed into a temporary, then copied
+            _record('elementwise in place', 0, nrow * ncol, nrow * ncol * _item_bytes(buf))
+        new_row = list if type(buf) is list else lambda it: array('d', it)
+        for r in range(nrow):
+            buf[out._row_slice(r)] = new_row(map(op, *[read(r) for read in readers]))
+        return out
+
+    def __iadd__(self, other):
+        return self._elementwise(add, (self, other), out=self)
+
+    def __isub__(self, other):
+        return self._elementwise(sub, (self, other), out=self)
+
+    def __imul__(self, other):
+        return self._elementwise(mul, (self, other), out=self)
+
+    def __itruediv__(self, other):
+        return self._elementwise(truediv, (self, other), out=self)
+
+    def axpy(self, a, x):
+        """
+        Fused in-place update self += a * x, without temporary matrices.
+        Row operation of Gaussian elimination: X[j, :].axpy(-k, X[i, :])
+        :param a: scalar
+        :param x: Matrix or array-like of the same shape (or a row to repeat)
+        :return: self
+        """
+        x = self._operand(x)
+        nrow, ncol = self.shape
+        if x.shape not in ((nrow, ncol), (1, ncol)):
+            raise ValueError(f"Can't broadcast {x.shape} onto {self.shape}")
+        if nrow > 1 and _shares_memory(x._buf, self._buf):
+            x = x.copy()  # rows written first may be read later
+        buf, xbuf = self._buf, x._buf
+        _touch(buf)
+        if _instruments:
+            _record('axpy', 0, nrow * ncol, nrow * ncol * _item_bytes(buf))
+        new_row = list if type(buf) is list else lambda it: array('d', it)
+        scale = repeat(a)
+        for r in range(nrow):
+            ys = self._row_slice(r)
+            xs = x._row_slice(r if x.shape[0] != 1 else 0)
+            buf[ys] = new_row(map(add, buf[ys], map(mul, scale, xbuf[xs])))
+        return self
 
     def __add__(self, other):
-        cpy = self[:, :]
-        for i in range(self.shape[0]):
-            try:
-                for j, v in zip(range(self.shape[1]), other):
-                    cpy[i, j] += v
-            except TypeError:
-                for j in range(self.shape[1]):
-                    cpy[i, j] += other
-        return cpy
+        return self._elementwise(add, (self, other))
 
-    def __rmul__(self, other):
-        cpy = self[:, :]
-        for i in range(self.shape[0]):
-            try:
-                for j, v in zip(range(self.shape[1]), other):
-                    cpy[i, j] *= v
-            except TypeError:
-                for j in range(self.shape[1]):
-                    cpy[i, j] *= other
-        return cpy
+    def __radd__(self, other):
+        return self._elementwise(add, (other, self))
+
+    def __sub__(self, other):
+        return self._elementwise(sub, (self, other))
+
+    def __rsub__(self, other):
+        return self._elementwise(sub, (other, self))
 
     def __mul__(self, other):
-        return self.__rmul__(other)
+        return self._elementwise(mul, (self, other))
 
-    def __sub__(self, other):
-        return self.__add__(-other)
+    def __rmul__(self, other):
+        return self._elementwise(mul, (other, self))
 
     def __truediv__(self, other):
-        cpy = self[:, :]
-        for i in range(self.shape[0]):
-            try:
-                for j, v in zip(range(self.shape[1]), other):
-                    cpy[i, j] /= v
-            except TypeError:
-                for j in range(self.shape[1]):
-                    cpy[i, j] /= other
-        return cpy
+        return self._elementwise(truediv, (self, other))
+
+    def __rtruediv__(self, other):
+        return self._elementwise(truediv, (other, self))
 
     def __neg__(self):
-        cpy = self[:, :]
-        for i in range(self.shape[0]):
-            for j in range(self.shape[1]):
-                cpy[i, j] = -cpy[i, j]
-        return cpy
+        return self._elementwise(neg, (self,))
 
     def round(self, v=0):
         """
@@ -153,11 +907,69 @@ class Matrix(object):
         :param v:
         :return:
         """
-        cpy = self[:, :]
-        for i in range(self.shape[0]):
-            for j in range(self.shape[1]):
-                cpy[i, j] = round(cpy[i, j], v)
-        return cpy
+        return self._elementwise(round, (self, v))
+
+    def __matmul__(self, other):
+        """
+        Matrix product A @ B
+        :param other: Matrix, LazyExpr (or list of lists)
+        :return: Matrix
+        """
+        if isinstance(other, LazyExpr):
+            other = other.evaluate()
+        elif not isinstance(other, Matrix):
+            other = Matrix(other)
+        return self._matmul(other)
+
+    def __rmatmul__(self, other):
+        other = other.evaluate() if isinstance(other, LazyExpr) else Matrix(other)
+        return other._matmul(self)
+
+    def _matmul(self, other, block=64, use_numpy=None):
+        """
+        Matrix product, handed off to numpy (BLAS) when it's installed and the
+        product is big enough, otherwise computed by cache-blocked kernel
+        :param other: Matrix
+        :param block: number of columns of <other> processed at once
+        :param use_numpy: force (True) or forbid (False) numpy path
+        :return: Matrix
+        """
+        (n, k), (k_other, m) = self.shape, other.shape
+        if k != k_other:
+            raise ValueError(f"Shapes {self.shape} and {other.shape} are not aligned")
+        if use_numpy is None:
+            use_numpy = n * k * m >= NUMPY_MIN_FLOPS
+        if (use_numpy and np is not None and type(self._buf) is not list
+                and type(other._buf) is not list):
+            return Matrix.from_buffer(self._ndarray() @ other._ndarray())
+        # rows of A and columns of B are both contiguous lists, so every
+        # element of the product is a single dot product of two lists
+        a_rows = self.values
+        b_cols = other.T.values
+        out = [[0.0] * m for _ in range(n)]
+        for j0 in range(0, m, block):  # block of B columns stays hot in cache
+            cols = b_cols[j0:j0 + block]
+            j1 = j0 + len(cols)
+            for row, out_row in zip(a_rows, out):
+                out_row[j0:j1] = [_sumprod(row, col) for col in cols]
+        flat = [val for row in out for val in row]
+        if _instruments:
+            _record('matmul', 0, n * m, n * m * _BOXED_FLOAT)
+        if type(self._buf) is list or type(other._buf) is list:
+            return Matrix._view(flat, (n, m), (m, 1))
+        return Matrix._view(array('d', flat), (n, m), (m, 1))
+
+    def _ndarray(self):
+        """
+        numpy array sharing the buffer with this matrix
+        :return: np.ndarray
+        """
+        size = self._buf.itemsize
+        start = self._offset
+        if self.shape[0] * self.shape[1] == 0:
+            start = 0  # offset of an empty view may point past the buffer
+        return np.ndarray(self.shape, dtype=np.float64, buffer=self._buf, offset=start * size,
+                          strides=(self._strides[0] * size, self._strides[1] * size))
 
     def __eq__(self, other):
         """
@@ -165,6 +977,8 @@ class Matrix(object):
         :param other:
         :return:
         """
+        if isinstance(other, LazyExpr):
+            other = other.evaluate()
         try:
             if self.shape != other.shape:
                 return False
@@ -190,12 +1004,245 @@ class Matrix(object):
         Return maximum value in the Matrix
         :return: maximum value
         """
-        return max([max(row) for row in self])
+        return self.memo('max', lambda: max([max(row) for row in self]))
 
     @property
     def T(self):
         """
-        Matrix transpose: interchange rows and columns
+        Matrix transpose: interchange rows and columns.
+        Returns a view, sharing the buffer with the original matrix
         :return: transposed Matrix
         """
-        return Matrix([[self[i, j] for i in range(self.shape[0])] for j in range(self.shape[1])])
+        if _instruments:
+            _record('view', 1)
+        return Matrix._view(self._buf, self.shape[::-1], self._strides[::-1], self._offset)
+
+
+@contextmanager
+def lazy():
+    """
+    Inside the block arithmetic on Matrix doesn't compute temporaries, but
+    builds LazyExpr tree, which is computed in one fused pass when assigned
+    (A[i, :] = expr writes straight into A), compared, or asked for `.values`:
+
+    with lazy():
+        b[j, :] -= b[i, :] * k
+        C = (A + B * c - D).evaluate()
+    """
+    global _lazy_depth
+    _lazy_depth += 1
+    try:
+        yield
+    finally:
+        _lazy_depth -= 1
+
+
+class AllocationStats:
+    """
+    Counters of an `instrument` block per operation type: Matrix objects
+    created, elements copied, bytes allocated and validation passes
+    """
+    FIELDS = ('matrices', 'elements', 'bytes', 'validations')
+
+    def __init__(self):
+        self.by_op = {}  # operation: [matrices, elements, bytes, validations]
+
+    def add(self, op, *counts):
+        """
+        Add counts of one operation
+        :param op: operation type
+        :param counts: matrices, elements, bytes, validations
+        :return:
+        """
+        totals = self.by_op.setdefault(op, [0, 0, 0, 0])
+        for i, count in enumerate(counts):
+            totals[i] += count
+
+    def __getitem__(self, op):
+        """
+        Counts of one operation type
+        :param op:
+        :return: dict of FIELDS
+        """
+        return dict(zip(self.FIELDS, self.by_op.get(op, [0, 0, 0, 0])))
+
+    @property
+    def totals(self):
+        """
+        Counts summed over all operations
+        :return: dict of FIELDS
+        """
+        return dict(zip(self.FIELDS, map(sum, zip([0, 0, 0, 0], *self.by_op.values()))))
+
+    def __repr__(self):
+        lines = [f"{'operation':<22}" + ''.join(f'{f:>13}' for f in self.FIELDS)]
+        for op, counts in sorted(self.by_op.items(), key=lambda item: -item[1][2]):
+            lines.append(f'{op:<22}' + ''.join(f'{c:>13}' for c in counts))
+        lines.append(f"{'total':<22}" + ''.join(f'{c:>13}' for c in self.totals.values()))
+        return '\n'.join(lines)
+
+
+@contextmanager
+def instrument():
+    """
+    Count temporaries of Matrix operations inside the block: views and
+    matrices created, elements copied, bytes allocated (elements of lists
+    counted with their float objects) and validation passes, per operation:
+
+    with instrument() as stats:
+        solve_gauss(A, b)
+    print(stats)
+    """
+    stats = AllocationStats()
+    _instruments.append(stats)
+    try:
+        yield stats
+    finally:
+        _instruments.remove(stats)
+
+
+class LazyExpr:
+    """
+    Deferred elementwise expression over matrices and scalars
+    """
+    # how operators are spelled in generated fused function
+    _templates = {add: '({} + {})', sub: '({} - {})', mul: '({} * {})',
+                  truediv: '({} / {})', neg: '(-{})', round: 'round({}, {})'}
+    _fused = {}  # tree signature: compiled function
+
+    def __init__(self, op, operands):
+        """
+        :param op: elementwise function of len(operands) arguments
+        :param operands: scalars, Matrix objects, LazyExpr or array-likes
+        """
+        self.op = op
+        self.operands = [x if isinstance(x, LazyExpr) else Matrix._operand(x) for x in operands]
+        self.shape = Matrix._broadcast_shape([x.shape for x in self.operands if hasattr(x, 'shape')])
+
+    def _signature(self):
+        """
+        Shape of the tree without the data: operations, and positions of
+        matrix leaves and scalars, which become arguments of the fused function
+        :return: (signature, list of leaves)
+        """
+        leaves, names = [], {}
+
+        def walk(node):
+            if isinstance(node, LazyExpr):
+                return (node.op,) + tuple(walk(x) for x in node.operands)
+            key = id(node) if isinstance(node, Matrix) else None  # every scalar is a separate leaf
+            if key not in names:
+                leaf = len(leaves)
+                leaves.append(node)
+                if key is None:
+                    return leaf
+                names[key] = leaf
+            return names[key]
+
+        return walk(self), leaves
+
+    @classmethod
+    def _compile(cls, signature, n_leaves):
+        """
+        Turn the tree signature into a single Python function of its leaves,
+        e.g. A + B * c - D becomes `lambda x0, x1, x2, x3: ((x0 + (x1 * x2)) - x3)`
+        :param signature: from `_signature`
+        :param n_leaves:
+        :return: function
+        """
+        namespace = {}
+
+        def emit(node):
+            if type(node) is int:
+                return f"x{node}"
+            op, args = node[0], [emit(x) for x in node[1:]]
+            template = cls._templates.get(op)
+            if template is None:  # arbitrary function is called by name
+                name = f"f{len(namespace)}"
+                namespace[name] = op
+                return f"{name}({', '.join(args)})"
+            return template.format(*args)
+
+        body = emit(signature)
+        args = ', '.join(f"x{i}" for i in range(n_leaves))
+        return eval(f"lambda {args}: {body}", namespace)
+
+    def evaluate(self, out=None):
+        """
+        Compute the expression in one pass over the result. Fused functions
+        are compiled once per tree signature, so a loop evaluating the same
+        expression over different rows and scalars doesn't call eval again.
+        :param out: Matrix to write the result into
+        :return: Matrix
+        """
+        signature, leaves = self._signature()
+        fused = self._fused.get(signature)
+        if fused is None:
+            if len(self._fused) >= 256:  # e.g. new lambdas as operations every time
+                self._fused.clear()
+            fused = self._fused[signature] = self._compile(signature, len(leaves))
+        return Matrix._map_rows(fused, leaves, out=out)
+
+    @property
+    def values(self):
+        return self.evaluate().values
+
+    def __add__(self, other):
+        return LazyExpr(add, (self, other))
+
+    def __radd__(self, other):
+        return LazyExpr(add, (other, self))
+
+    def __sub__(self, other):
+        return LazyExpr(sub, (self, other))
+
+    def __rsub__(self, other):
+        return LazyExpr(sub, (other, self))
+
+    def __mul__(self, other):
+        return LazyExpr(mul, (self, other))
+
+    def __rmul__(self, other):
+        return LazyExpr(mul, (other, self))
+
+    def __truediv__(self, other):
+        return LazyExpr(truediv, (self, other))
+
+    def __rtruediv__(self, other):
+        return LazyExpr(truediv, (other, self))
+
+    def __neg__(self):
+        return LazyExpr(neg, (self,))
+
+    def round(self, v=0):
+        return LazyExpr(round, (self, v))
+
+    def __matmul__(self, other):
+        return self.evaluate() @ other
+
+    def __rmatmul__(self, other):
+        return other @ self.evaluate()
+
+    def __eq__(self, other):
+        return self.evaluate() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __getitem__(self, item):
+        return self.evaluate()[item]
+
+    def __iter__(self):
+        return iter(self.evaluate())
+
+    def __array__(self, dtype=None, copy=None):
+        return self.evaluate().__array__(dtype)
+
+    def __repr__(self):
+        return repr(self.evaluate())
+
+    def __getattr__(self, name):
+        # everything else (T, copy, max, ...) is taken from the computed Matrix
+        if name.startswith('_') or name in ('op', 'operands', 'shape'):
+            raise AttributeError(name)
+        return getattr(self.evaluate(), name)
@@ -1,108 +1,275 @@
+import os
+import re
 import string
-from Matrix import Matrix
+from array import array
+from itertools import islice
+from Matrix import Matrix, _instruments, _record
+
+_WS = '[' + re.escape(string.whitespace) + ']*'
 
 
 class MatrixParser:
-    def __init__(self):
+    def __init__(self, fast=True):
+        """
+        :param fast: match whole rows with regular expressions, falling back to
+            character by character parsing only for the rest (first and last row,
+            rows split between chunks, errors). Both engines accept the same input.
+        """
         # whether parsing has completed, or we need to expect another line
         self.complete = True
         self.row_sep = ';'
         self.col_sep = ','
+        self.fast = fast
+        self._patterns = None
+        self._reset()
+
+    def _reset(self):
+        """
+        Forget the state of previous matrix
+        :return:
+        """
+        self._buf = array('d')  # parsed values, row-major
+        self._ncol = None  # length of the first row
+        self._nrow = 0
+        self._row_len = 0
+        self._matrix_start = False
+        self._row_start = False
+        self._row_separated = False
+        self._finished = False  # closing bracket of the matrix was seen
+        self._value = None  # characters of the current number, may span chunks
+        self._pos = 0  # position of the current chunk in the whole input
+        self._context = ''  # end of the previous chunk, for error messages
 
     def parse(self, s: str):
         """
         Parse string to matrix
         Expected format example: [[1, 2]; [3,2]; [3,4]]
+        Numbers may have a sign, fractional part and exponent: -1.5e-3
 
         Note:
          If value has started, there should be terminating character after it.
          For example, `2]` if a correct value 2, `2 ` is not.
         :return: Matrix object
         """
-        self.complete = False
-        parsed = []
-        matrix_start = False
-        row_start = False
-        row_separated = False
-        row_index = 0
-        value = None
-        for i, c in enumerate(s):
+        self._reset()
+        self.feed(s)
+        return self.close()
+
+    def parse_file(self, source, chunk_size=1 << 20):
+        """
+        Parse matrix from a file chunk by chunk, without reading it whole
+        :param source: path or file object (text or binary)
+        :param chunk_size: characters (or bytes) read at once
+        :return: Matrix object
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                return self.parse_file(f, chunk_size)
+        self._reset()
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            self.feed(chunk)
+        return self.close()
+
+    def feed(self, chunk):
+        """
+        Parse next part of the input. Parser keeps only its position in the
+        grammar and the number split between chunks, values go straight into
+        a buffer of doubles. Errors report position in the whole input.
+        :param chunk: str or bytes
+        :return:
+        """
+        s = chunk if isinstance(chunk, str) else bytes(chunk).decode('latin-1')  # non-ASCII is a bad char anyway
+        if not self._finished:
+            self.complete = False
+        pos, n = 0, len(s)
+        while pos < n:
+            if (self.fast and self._matrix_start and not self._row_start and self._value is None
+                    and not self._row_separated):  # a separator carried over from the last chunk
+                pos = self._feed_rows(s, pos)
+            # slow path up to the end of the next row, where fast one can continue
+            end = s.find(']', pos) + 1 if self.fast else n
+            end = end or n
+            self._feed_chars(s, pos, end)
+            pos = end
+        self._pos += n
+        self._context = (self._context + s[-3:])[-3:]
+
+    def _row_patterns(self):
+        """
+        Compiled regular expressions for current separators: the first row and
+        the following rows (preceded by row separator), and substrings which
+        make a row invalid, though float() would accept its values
+        :return: (first, following, bad)
+        """
+        seps = (self.row_sep, self.col_sep)
+        if self._patterns is None or self._patterns[0] != seps:
+            row = r'\[([-+0-9eE.' + re.escape(string.whitespace + self.col_sep) + r']*)\]'
+            # space after a value, value starting with `.`
+            bad = tuple(w + c for w in string.whitespace for c in (self.col_sep, '.')) + (self.col_sep + '.',)
+            self._patterns = (seps, re.compile(_WS + row),
+                              re.compile(_WS + re.escape(self.row_sep) + _WS + row), bad)
+        return self._patterns[1:]
+
+    def _feed_rows(self, s, pos):
+        """
+        Parse as many complete well-formed rows as possible, starting between
+        rows: a row is cut out by regular expression and converted with one
+        split and float() per value. Anything unusual is left to `_feed_chars`
+        :param s: current chunk
+        :param pos: position in the chunk
+        :return: position after the last parsed row
+        """
+        first, following, bad = self._row_patterns()
+        buf, col_sep = self._buf, self.col_sep
+        m = (following if self._nrow else first).match(s, pos)
+        while m:
+            row = m.group(1)
+            if row.lstrip().startswith('.') or any(b in row for b in bad):
+                break
+            values = row.split(col_sep)
+            if not values[-1].strip():  # empty row or trailing separator
+                values.pop()
+            elif values[-1][-1] in string.whitespace:  # `2 ]`
+                break
+            size = len(buf)
+            try:
+                buf.extend(map(float, values))
+            except ValueError:  # malformed number, `_feed_chars` will point to it
+                del buf[size:]
+                break
+            self._row_len = len(values)
+            self._end_row()
+            pos = m.end()
+            m = following.match(s, pos)
+        return pos
+
+    def _feed_chars(self, s, start, stop):
+        """
+        Parse s[start:stop] character by character
+        :param s: current chunk
+        :param start:
+        :param stop:
+        :return:
+        """
+        buf = self._buf
+        matrix_start, row_start = self._matrix_start, self._row_start
+        row_separated, value = self._row_separated, self._value
+        for i, c in enumerate(islice(s, start, stop), start):
             if c in string.whitespace:
                 if value is not None:
                     self._char_err(s, i)
                 continue
-            if c == '[':
+            if c in "0123456789":
+                if not row_start:
+                    self._char_err(s, i)
+                value = c if value is None else value + c
+            elif c == '[':
+                if self._finished:
+                    self._char_err(s, i)
                 if not matrix_start:
                     matrix_start = True
-                elif not row_start:
+                elif not row_start and (row_separated or not self._nrow):
                     row_start = True
-                    parsed.append([])
+                    self._row_len = 0
                 else:
                     self._char_err(s, i)
             elif c == ']':
                 row_separated = False
-                if value:
-                    self._val_to_lst(parsed[row_index], value)
+                if value is not None:
+                    self._end_value(buf, value, s, i)
                     value = None
                 if row_start:
                     row_start = False
+                    self._end_row()
                 elif matrix_start:
                     matrix_start = False
-                    self.complete = True
+                    self._finished = self.complete = True
                 else:
                     self._char_err(s, i)
-            elif c in "0123456789":
-                if value is None:
+            elif c in '+-':
+                if value is None and row_start:
                     value = c
-                else:
+                elif value is not None and value[-1] in 'eE':
                     value += c
-            elif c == '.' and value is not None:
+                else:
+                    self._char_err(s, i)
+            elif c in 'eE' and value is not None and value[-1] in "0123456789." and 'e' not in value.lower():
+                value += c
+            elif c == '.' and value is not None and '.' not in value and 'e' not in value.lower():
                 value += c
             elif c == self.col_sep and row_start:
-                if value:
-                    self._val_to_lst(parsed[row_index], value)
+                if value is not None:
+                    self._end_value(buf, value, s, i)
                     value = None
                 else:
                     self._char_err(s, i)
-                continue
             elif c == self.row_sep and matrix_start:
-                if row_start:
-                    self._char_err(s, i)
-                if not row_separated:
-                    row_separated = True
-                else:
+                if row_start or row_separated:
                     self._char_err(s, i)
-                row_index += 1
-                row_start = False
-                continue
+                row_separated = True
             else:
                 self._char_err(s, i)
-        if not self.complete:
+        self._matrix_start, self._row_start = matrix_start, row_start
+        self._row_separated, self._value = row_separated, value
+
+    def close(self):
+        """
+        Finish parsing
+        :return: Matrix object
+        """
+        if not self._finished or self._value is not None:
             raise ValueError("Matrix is not ended properly")
-        return Matrix(parsed)
+        if self._nrow == 0:
+            M = Matrix([])
+        else:
+            M = Matrix._view(self._buf, (self._nrow, self._ncol), (self._ncol, 1))
+            if _instruments:
+                _record('parse', 1, len(self._buf), 8 * len(self._buf))
+        self._reset()
+        self.complete = True
+        return M
+
+    def _end_value(self, buf, value, s, i):
+        """
+        Convert finished number and append it to the buffer
+        :param buf:
+        :param value: characters of the number
+        :param s: current chunk
+        :param i: position of the terminating character
+        :return:
+        """
+        try:
+            buf.append(float(value))
+        except ValueError:
+            self._char_err(s, i)
+        self._row_len += 1
+
+    def _end_row(self):
+        """
+        Check that closed row has the same length as the first one
+        :return:
+        """
+        if self._ncol is None:
+            self._ncol = self._row_len
+        elif self._ncol != self._row_len:
+            raise ValueError(f"Row {self._nrow} differs in length: {self._ncol} != {self._row_len}")
+        self._nrow += 1
 
     def _char_err(self, s, i):
         """
         Output Syntax error and pointer (literally) to invalid character
-        :param s:
-        :param i:
+        :param s: current chunk
+        :param i: position in the chunk
         :return:
         """
-        start_i = max(i - 3, 0)
-        end_i = min(len(s), i + 3)
-        err_str = f"Bad char: `{s[i]}` (pos: {i}) in {s[start_i:end_i]}"
+        ctx = self._context + s
+        j = i + len(self._context)
+        start_i = max(j - 3, 0)
+        end_i = min(len(ctx), j + 3)
+        err_str = f"Bad char: `{s[i]}` (pos: {self._pos + i}) in {ctx[start_i:end_i]}"
         filler = " " * (len(err_str) + 10)
         pos_str = "\n" + filler + "↑" + " " * 2
         raise SyntaxError(err_str + pos_str)
-
-    def _val_to_lst(self, lst: list, val: str):
-        """
-        Convert value from string to it's correct type
-        :param lst:
-        :param val:
-        :return:
-        """
-        if '.' in val:
-            lst.append(float(val))
-        else:
-            lst.append(int(val))
@@ -0,0 +1,29 @@
+"""
+Compare multi-threaded blocked LU solver with its single-threaded run,
+numpy.linalg.solve and (for small n) pure Python solve_gauss.
+
+Usage: `python3 bench_blocked.py [n ...]`
+"""
+import os
+import sys
+import numpy as np
+from bench_matmul import best_time
+from gauss import solve_blocked, solve_gauss
+
+
+if __name__ == '__main__':
+    sizes = [int(n) for n in sys.argv[1:]] or [250, 500, 1000, 2000]
+    workers = os.cpu_count()
+    rng = np.random.default_rng(0)
+    print(f"{'n':>6}{'gauss, s':>12}{'1 thread, s':>14}{f'{workers} threads, s':>16}"
+          f"{'speedup':>9}{'numpy, s':>12}{'residual':>11}")
+    for n in sizes:
+        A = rng.random((n, n)) + n * np.eye(n)
+        b = rng.random((n, 1))
+        t_gauss = best_time(lambda: solve_gauss(A, b), repeat=1) if n <= 250 else float('nan')
+        t_single = best_time(lambda: solve_blocked(A, b, workers=1))
+        t_multi = best_time(lambda: solve_blocked(A, b, workers=workers))
+        t_numpy = best_time(lambda: np.linalg.solve(A, b))
+        residual = np.abs(A @ solve_blocked(A, b) - b).max()
+        print(f"{n:>6}{t_gauss:>12.3f}{t_single:>14.4f}{t_multi:>16.4f}"
+              f"{t_single / t_multi:>9.2f}{t_numpy:>12.4f}{residual:>11.1e}")
@@ -0,0 +1,55 @@
+"""
+Time matrix product for growing sizes: naive triple loop over Matrix elements,
+cache-blocked pure Python kernel and numpy (BLAS) fast path.
+
+Usage: `python3 bench_matmul.py [max_side]`
+"""
+import random
+import sys
+import time
+from Matrix import Matrix, np
+from matrix_tools import dot
+
+
+def naive_matmul(A, B):
+    """
+    Reference product with element access through __getitem__
+    :param A:
+    :param B:
+    :return: list of lists
+    """
+    n, k = A.shape
+    m = B.shape[1]
+    return [[sum(A[i, t] * B[t, j] for t in range(k)) for j in range(m)] for i in range(n)]
+
+
+def best_time(f, repeat=3):
+    """
+    Best wall time of <repeat> runs of f
+    :param f:
+    :param repeat:
+    :return: seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def random_matrix(n):
+    return Matrix([[random.random() for _ in range(n)] for _ in range(n)])
+
+
+if __name__ == '__main__':
+    max_side = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    print(f"{'n':>6}{'naive, s':>12}{'blocked, s':>12}{'numpy, s':>12}{'MFLOP/s':>10}")
+    n = 16
+    while n <= max_side:
+        A, B = random_matrix(n), random_matrix(n)
+        t_naive = best_time(lambda: naive_matmul(A, B), repeat=1) if n <= 128 else float('nan')
+        t_blocked = best_time(lambda: dot(A, B, use_numpy=False))
+        t_numpy = best_time(lambda: dot(A, B, use_numpy=True)) if np is not None else float('nan')
+        print(f"{n:>6}{t_naive:>12.4f}{t_blocked:>12.4f}{t_numpy:>12.5f}{2 * n ** 3 / t_blocked / 1e6:>10.1f}")
+        n *= 2
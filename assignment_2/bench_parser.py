@@ -0,0 +1,45 @@
+"""
+Throughput of MatrixParser: character by character engine against the
+regex-based one, for strings and for a file read in chunks.
+
+Usage: `python3 bench_parser.py [megabytes]`
+"""
+import os
+import random
+import sys
+import tempfile
+from bench_matmul import best_time
+from MatrixParser import MatrixParser
+
+
+def matrix_text(size, ncol=100):
+    """
+    Bracket format matrix of random numbers of about <size> characters
+    :param size:
+    :param ncol:
+    :return: str
+    """
+    rows = []
+    length = 0
+    while length < size:
+        row = '[' + ', '.join(f'{random.uniform(-1e3, 1e3):.6g}' for _ in range(ncol)) + ']'
+        rows.append(row)
+        length += len(row) + 2
+    return '[' + ';\n '.join(rows) + ']'
+
+
+if __name__ == '__main__':
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    text = matrix_text(int(megabytes * 2 ** 20))
+    mb = len(text) / 2 ** 20
+    t_chars = best_time(lambda: MatrixParser(fast=False).parse(text), repeat=1)
+    t_regex = best_time(lambda: MatrixParser().parse(text))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'matrix.txt')
+        with open(path, 'w') as f:
+            f.write(text)
+        t_file = best_time(lambda: MatrixParser().parse_file(path))
+    print(f"{mb:.1f} MB, {MatrixParser().parse(text).shape} matrix")
+    print(f"{'engine':<22}{'time, s':>10}{'MB/s':>10}")
+    for name, t in [('char by char', t_chars), ('regex', t_regex), ('regex, parse_file', t_file)]:
+        print(f"{name:<22}{t:>10.3f}{mb / t:>10.1f}")
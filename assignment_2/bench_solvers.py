@@ -0,0 +1,148 @@
+"""
+Benchmark suite for solve_gauss and gauss_inv: Matrix and np.ndarray inputs
+against numpy.linalg for n = 2 .. 2000. For every solver and size it records
+the best time and the residual max|Ax - b| (max|AX - I| for inverses), fits
+the empirical complexity exponent k of t ~ n^k and writes a JSON report.
+
+A solver is skipped for the remaining sizes once its extrapolated time exceeds
+--budget seconds. With --baseline, times are compared to an older report and
+the script exits with status 1 if any solver got slower than --tolerance.
+
+Usage: `python3 bench_solvers.py [n ...] [--budget s] [--json out.json] [--baseline old.json]`
+"""
+import argparse
+import json
+import platform
+import sys
+from math import log
+import numpy as np
+from bench_matmul import best_time
+from gauss import solve_gauss, gauss_inv
+from Matrix import Matrix
+
+SIZES = [2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000]
+# name: (solver of A, b, input type, result kind)
+SOLVERS = {
+    'solve_gauss[Matrix]': (lambda A, b: solve_gauss(A, b)[1], Matrix, 'solve'),
+    'solve_gauss[ndarray]': (lambda A, b: solve_gauss(A, b)[1], np.ndarray, 'solve'),
+    'gauss_inv[Matrix]': (lambda A, b: gauss_inv(A), Matrix, 'inverse'),
+    'gauss_inv[ndarray]': (lambda A, b: gauss_inv(A), np.ndarray, 'inverse'),
+    'numpy.linalg.solve': (lambda A, b: np.linalg.solve(A, b), np.ndarray, 'solve'),
+    'numpy.linalg.inv': (lambda A, b: np.linalg.inv(A), np.ndarray, 'inverse'),
+}
+
+
+def residual(A, b, x, kind):
+    """
+    Max-norm residual of the result
+    :param A:
+    :param b:
+    :param x: solution of Ax = b or inverse of A (Matrix or np.ndarray)
+    :param kind: 'solve' or 'inverse'
+    :return: float
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if kind == 'inverse':
+        return float(np.abs(A @ x - np.eye(len(A))).max())
+    return float(np.abs(A @ x - b).max())
+
+
+def fit_exponent(points, min_time=1e-3):
+    """
+    Least-squares slope of log(t) against log(n). Points faster than min_time
+    are dominated by call overhead and are left out while enough remain.
+    :param points: list of (n, seconds)
+    :param min_time:
+    :return: exponent or None if there are less than two points
+    """
+    slow = [(n, t) for n, t in points if t >= min_time]
+    points = slow if len(slow) >= 2 else points
+    if len(points) < 2:
+        return None
+    xs = [log(n) for n, _ in points]
+    ys = [log(t) for _, t in points]
+    x_mean, y_mean = sum(xs) / len(xs), sum(ys) / len(ys)
+    var = sum((x - x_mean) ** 2 for x in xs)
+    if var == 0:
+        return None
+    return sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / var
+
+
+def run(sizes, budget, repeat=3, seed=0):
+    """
+    Time every solver on diagonally dominant random systems of given sizes
+    :param sizes:
+    :param budget: seconds, a solver is skipped when it is expected to run longer
+    :param repeat:
+    :param seed:
+    :return: report dictionary
+    """
+    rng = np.random.default_rng(seed)
+    results = {name: [] for name in SOLVERS}
+    print(f"{'solver':<22}{'n':>6}{'time, s':>12}{'residual':>11}{'vs numpy':>10}")
+    for n in sizes:
+        A = rng.random((n, n)) + n * np.eye(n)
+        b = rng.random((n, 1))
+        inputs = {np.ndarray: (A, b), Matrix: (Matrix(A.tolist()), Matrix(b.tolist()))}
+        reference = {}
+        for name, (solver, input_type, kind) in SOLVERS.items():
+            if results[name]:
+                last = results[name][-1]
+                if last['seconds'] * (n / last['n']) ** 3 > budget:
+                    continue
+            args = inputs[input_type]
+            x = solver(*args)
+            t = best_time(lambda: solver(*args), repeat=repeat if n <= 200 else 1)
+            if name.startswith('numpy'):
+                reference[kind] = t
+            results[name].append({'n': n, 'seconds': t, 'residual': residual(A, b, x, kind)})
+        for name, (_, _, kind) in SOLVERS.items():
+            if results[name] and results[name][-1]['n'] == n:
+                r = results[name][-1]
+                ratio = r['seconds'] / reference[kind] if kind in reference else float('nan')
+                print(f"{name:<22}{n:>6}{r['seconds']:>12.5f}{r['residual']:>11.1e}{ratio:>10.1f}")
+    exponents = {name: fit_exponent([(r['n'], r['seconds']) for r in rs]) for name, rs in results.items()}
+    print('fitted exponent k of t ~ n^k:')
+    for name, k in exponents.items():
+        print(f"  {name:<22}{'-' if k is None else f'{k:.2f}'}")
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'sizes': sizes, 'budget': budget,
+            'results': results, 'exponents': exponents}
+
+
+def compare(report, baseline, tolerance):
+    """
+    Find solvers which got slower than the baseline report
+    :param report:
+    :param baseline: older report
+    :param tolerance: allowed ratio of new time to old time
+    :return: list of (solver, n, ratio) over tolerance
+    """
+    regressions = []
+    for name, rs in report['results'].items():
+        old = {r['n']: r['seconds'] for r in baseline['results'].get(name, [])}
+        for r in rs:
+            if r['n'] in old and r['seconds'] > tolerance * old[r['n']]:
+                regressions.append((name, r['n'], r['seconds'] / old[r['n']]))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Gaussian elimination solvers')
+    parser.add_argument('sizes', nargs='*', type=int, default=SIZES)
+    parser.add_argument('--budget', type=float, default=10.0, help='max seconds per measurement')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', default='bench_solvers.json', help='report path')
+    parser.add_argument('--baseline', help='earlier report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    args = parser.parse_args()
+    report = run(args.sizes, args.budget, args.repeat)
+    with open(args.json, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'report written to {args.json}')
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name, n, ratio in regressions:
+            print(f'regression: {name} n={n} is {ratio:.2f}x slower')
+        sys.exit(1 if regressions else 0)
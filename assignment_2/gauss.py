@@ -1,6 +1,48 @@
+import argparse
+import mmap
 import numpy as np
-from Matrix import Matrix
-from matrix_tools import eye
+import sys
+import tempfile
+from array import array
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from math import isqrt, sqrt
+import os
+from operator import mul
+from Matrix import Matrix, _instruments, _record
+from matrix_tools import eye, zeros, CSRMatrix, min_degree_ordering
+
+
+def _is_complex(M):
+    """
+    :param M: Matrix or np.ndarray
+    :return: whether M holds complex values
+    """
+    return type(M._buf) is list if isinstance(M, Matrix) else np.iscomplexobj(M)
+
+
+def _as_matrix(M, is_complex=False):
+    """
+    Copy M into a Matrix. np.ndarray is copied into float64 array, which the
+    Matrix then shares, so results are written back without conversion.
+    :param M: Matrix or np.ndarray (1-d array is treated as a column)
+    :param is_complex: copy into a buffer which takes complex values, for
+        operations with a complex operand
+    :return: (Matrix, function returning result in the type of M)
+    """
+    if isinstance(M, Matrix):
+        X = M[:, :].copy()  # slices are views, copy explicitly
+        if is_complex and type(X._buf) is not list:  # buffer of doubles can't take complex values
+            X = Matrix._view(list(X._buf), X.shape, X._strides)
+        return X, lambda: X
+    arr = np.array(M, dtype=np.result_type(M, np.float64, np.complex128 if is_complex else np.float64))
+    if arr.ndim == 1:
+        arr = arr.reshape(-1, 1)
+    if arr.dtype != np.float64:  # complex values can't live in a buffer of doubles
+        X = Matrix(arr.tolist())
+        return X, lambda: np.array(X.values)
+    return Matrix.from_buffer(arr), lambda: arr
 
 
 def solve_gauss(A, b):
@@ -11,18 +53,26 @@ def solve_gauss(A, b):
     1) Swapping two rows
     2) Multiplying a row by a nonzero number
     3) Adding a multiple of one row another row
+
+    Matrix and np.ndarray inputs go through the same elimination on Matrix,
+    arrays are shared with it zero-copy and returned as arrays.
     :param A:
     :return: A
     """
-    nrow, ncol = A.shape if len(A.shape) == 2 else (A.shape, None)
-    X = A[:, :]  # Make a copy (needed for np.array)
-    b = b[:, :]  # Make a copy
+    if isinstance(A, Matrix) and A._cache is not None and A.shape[0] == A.shape[1] and A.shape[0]:
+        lu = _lu(A)  # cached factors solve in O(n^2)
+        if not lu.singular:  # pivots above n * eps * max|A|, otherwise eliminate as usual
+            return eye(A.shape[0]), lu.solve(b)
+    is_complex = _is_complex(A) or _is_complex(b)  # both are complex if one is
+    X, X_result = _as_matrix(A, is_complex)
+    b, b_result = _as_matrix(b, is_complex)
+    nrow, ncol = X.shape
     for i in range(min((nrow, ncol))):
         if X[i, i] == 0:  # find row with non-zero on the pivot place, swap
             for j in range(i + 1, nrow):
                 if X[j, i] != 0:
-                    X[i, :], X[j, :] = X[j, :], X[i, :]
-                    b[i, :], b[j, :] = b[j, :], b[i, :]
+                    X[i, :], X[j, :] = X[j, :].copy(), X[i, :].copy()
+                    b[i, :], b[j, :] = b[j, :].copy(), b[i, :].copy()
                     break
         if X[i, i] != 1 and X[i, i] != 0:
             k = X[i, i]  # scale factor
@@ -32,27 +82,722 @@ def solve_gauss(A, b):
         for j in range(i + 1, nrow):  # Remove corresponding coef. in other equations
             if X[j, i] != 0:
                 k = X[j, i]  # scale factor
-                X[j, :] -= X[i, :] * k
-                b[j, :] -= b[i, :] * k
+                X[j, :].axpy(-k, X[i, :])  # X[j, :] -= X[i, :] * k in place
+                b[j, :].axpy(-k, b[i, :])
         for j in range(i - 1, -1, -1):  # remove coef. above the main diagonal
             if X[j, i] != 0:
                 k = X[j, i]
-                X[j, :] -= X[i, :] * k
-                b[j, :] -= b[i, :] * k
-    return X, b
+                X[j, :].axpy(-k, X[i, :])
+                b[j, :].axpy(-k, b[i, :])
+    return X_result(), b_result()
+
+
+def solve_sparse(A, b, ordering='min_degree', pivot_tol=0.1):
+    """
+    Solve SOLE with sparse matrix using Gaussian elimination on rows stored
+    as {column: value} dictionaries, so time and memory depend on the number
+    of nonzeros (plus fill-in) instead of n^2.
+
+    Unknowns are renumbered by fill-reducing ordering first. Diagonal element
+    is used as a pivot unless it is smaller than <pivot_tol> times the largest
+    candidate in its column (threshold partial pivoting).
+
+    Elimination is pure Python, one dictionary operation per update, so time
+    follows the work of the factorization: linear for banded (1D) systems,
+    about n^1.5 for 2D grids (5-point Laplacian: 10k unknowns in ~4 s,
+    50k in ~1 min), worse for 3D.
+    :param A: square CSRMatrix, Matrix or np.ndarray
+    :param b: right-hand side: Matrix or np.ndarray of shape (n, k), or 1-d vector
+    :param ordering: 'min_degree' or None to keep the original order
+    :param pivot_tol: 0 < pivot_tol <= 1, 1 for classic partial pivoting
+    :return: solution x of the same type as b (column Matrix for a list)
+    """
+    if not isinstance(A, CSRMatrix):
+        A = CSRMatrix.from_dense(A)
+    n = A.shape[0]
+    if A.shape[1] != n:
+        raise ValueError("Sparse solver requires square matrix, got", A.shape)
+    B = Matrix._operand(b)
+    if B.shape == (1, n) and n != 1:  # vector given as a row
+        B = B.T
+    if B.shape[0] != n:
+        raise ValueError(f"Right-hand side of shape {B.shape} doesn't match {A.shape}")
+    order = min_degree_ordering(A) if ordering == 'min_degree' else list(range(n))
+    position = [0] * n
+    for k, i in enumerate(order):
+        position[i] = k
+    # rows and columns in the new numbering, col_rows[j]: active rows with nonzero in column j
+    rows = []
+    col_rows = [set() for _ in range(n)]
+    for k, i in enumerate(order):
+        cols, vals = A.row(i)
+        rows.append({position[j]: v for j, v in zip(cols, vals)})
+        for j in rows[k]:
+            col_rows[j].add(k)
+    rhs = [B._row(i) for i in order]
+    pivots = []
+    for k in range(n):
+        candidates = col_rows[k]
+        if not candidates:
+            raise ValueError(f"Matrix is singular (column {order[k]} has no pivot)")
+        best = max(candidates, key=lambda i: abs(rows[i][k]))
+        p = k if k in candidates and abs(rows[k][k]) >= pivot_tol * abs(rows[best][k]) else best
+        pivot_row, pivot = rows[p], rows[p][k]
+        if pivot == 0:
+            raise ValueError(f"Matrix is singular (column {order[k]} has no pivot)")
+        for j in pivot_row:
+            col_rows[j].discard(p)
+        pivots.append(p)
+        for i in candidates:
+            row = rows[i]
+            f = row.pop(k) / pivot
+            for j, v in pivot_row.items():
+                if j in row:
+                    row[j] -= f * v
+                elif j != k:
+                    row[j] = -f * v
+                    col_rows[j].add(i)
+            rhs[i] = [x - f * y for x, y in zip(rhs[i], rhs[p])]
+        candidates.clear()
+    # back substitution, pivot row of step k only has columns >= k
+    x = [None] * n
+    for k in range(n - 1, -1, -1):
+        p = pivots[k]
+        pivot_row = rows[p]
+        acc = rhs[p]
+        for j, v in pivot_row.items():
+            if j != k:
+                acc = [a - v * xj for a, xj in zip(acc, x[j])]
+        x[k] = [a / pivot_row[k] for a in acc]
+    solution = zeros(B.shape)
+    for k, i in enumerate(order):
+        solution[i, :] = x[k]
+    if isinstance(b, Matrix) or type(b) in (list, tuple):
+        return solution
+    return np.asarray(solution).reshape(np.shape(b))
+
+
+class LUFactorization:
+    """
+    LU factorization with partial pivoting: P A = L U, where L is unit lower
+    triangular and U is upper triangular. Factoring costs 2/3 n^3 once, then
+    every right-hand side is solved by two triangular substitutions in O(n^2),
+    so keep the object to reuse factors of the same matrix:
+
+    lu = LUFactorization(A)
+    x1, x2 = lu.solve(b1), lu.solve(b2)
+    """
+    def __init__(self, A, tol=None):
+        """
+        :param A: square Matrix or np.ndarray
+        :param tol: pivots not larger than tol in absolute value make the matrix
+            singular, n * eps * max|A| (rounding error of the elements) by default
+        """
+        if A.shape[0] != A.shape[1]:
+            raise ValueError("LU factorization of non-square matrix")
+        self._is_array = not isinstance(A, Matrix)
+        LU, _ = _as_matrix(A)
+        n = LU.shape[0]
+        if tol is None:
+            tol = n * np.finfo(np.float64).eps * max((abs(v) for row in LU.values for v in row), default=0)
+        self.perm = list(range(n))  # row i of P A is row perm[i] of A
+        self.n_swaps = 0
+        self.singular = False
+        for k in range(n):
+            col = LU[k:, k]._row(0)
+            p = k + max(range(n - k), key=lambda i: abs(col[i]))
+            if abs(col[p - k]) <= tol:  # no pivot in this column
+                self.singular = True
+                continue
+            if p != k:  # largest element becomes the pivot
+                LU[k, :], LU[p, :] = LU[p, :].copy(), LU[k, :].copy()
+                self.perm[k], self.perm[p] = self.perm[p], self.perm[k]
+                self.n_swaps += 1
+            pivot = LU[k, k]
+            for i in range(k + 1, n):
+                if LU[i, k] != 0:
+                    factor = LU[i, k] / pivot
+                    LU[i, k] = factor  # multiplier is kept in place of eliminated zero
+                    LU[i, k + 1:].axpy(-factor, LU[k, k + 1:])
+        self.LU = LU
+        rows = LU.values
+        self._lower = [row[:i] for i, row in enumerate(rows)]
+        self._upper = [row[i:] for i, row in enumerate(rows)]
+
+    @property
+    def det(self):
+        """
+        Determinant of the factored matrix, 0 if it is singular
+        :return:
+        """
+        if self.singular:
+            return 0.0
+        det = -1.0 if self.n_swaps % 2 else 1.0
+        for row in self._upper:
+            det *= row[0]
+        return det
+
+    def solve(self, b):
+        """
+        Solve A x = b with the stored factors
+        :param b: Matrix or np.ndarray of shape (n, k), or 1-d array
+        :return: x of the same type as b (np.ndarray results are 2-d)
+        """
+        if self.singular:
+            raise ValueError("Matrix is singular")
+        B, B_result = _as_matrix(b, type(self.LU._buf) is list)
+        n = len(self.perm)
+        if B.shape[0] != n:
+            raise ValueError(f"Right-hand side of shape {B.shape} doesn't match ({n}, {n})")
+        for c in range(B.shape[1]):
+            column = B.T[c, :]
+            v = column._row(0)
+            v = [v[p] for p in self.perm]
+            for i, lower in enumerate(self._lower):  # L y = P b
+                v[i] -= sum(map(mul, lower, v))
+            for i in range(n - 1, -1, -1):  # U x = y
+                upper = self._upper[i]
+                v[i] = (v[i] - sum(map(mul, islice(upper, 1, None), islice(v, i + 1, None)))) / upper[0]
+            column[0, :] = v
+        return B_result()
+
+    def inverse(self):
+        """
+        Inverse of the factored matrix
+        :return: Matrix or np.ndarray, same as the factored matrix
+        """
+        n = len(self.perm)
+        return self.solve(np.eye(n) if self._is_array else eye(n))
+
+
+def blocked_lu(A, block=128, workers=None, dtype=np.float64, tol=None):
+    """
+    Right-looking blocked LU factorization with partial pivoting over numpy
+    arrays. Every step factors a panel of <block> columns, computes the block
+    row of U and updates the trailing submatrix tile by tile on a thread pool:
+    numpy releases the GIL inside matrix products, so the tiles run on all cores.
+    :param A: square Matrix or np.ndarray
+    :param block: panel width (and tile side)
+    :param workers: number of threads, all cores by default
+    :param dtype: precision of the factors
+    :param tol: pivots not larger than tol in absolute value make the matrix
+        singular, n * eps * max|A| in precision of dtype by default
+    :return: (LU, perm): L (unit, below the diagonal) and U packed into one
+        array, row i of P A is row perm[i] of A
+    """
+    LU = np.array(A, dtype=dtype)
+    n = LU.shape[0]
+    if LU.shape != (n, n):
+        raise ValueError("LU factorization of non-square matrix")
+    if tol is None:  # pivot smaller than rounding error of the matrix entries counts as zero
+        tol = n * np.finfo(dtype).eps * np.abs(LU).max(initial=0)
+    perm = np.arange(n)
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        for k0 in range(0, n, block):
+            k1 = min(k0 + block, n)
+            for j in range(k0, k1):  # unblocked factorization of the panel
+                p = j + int(np.argmax(np.abs(LU[j:, j])))
+                if abs(LU[p, j]) <= tol:
+                    raise ValueError("Matrix is singular")
+                if p != j:
+                    LU[[j, p]] = LU[[p, j]]
+                    perm[[j, p]] = perm[[p, j]]
+                LU[j + 1:, j] /= LU[j, j]
+                LU[j + 1:, j + 1:k1] -= np.outer(LU[j + 1:, j], LU[j, j + 1:k1])
+            if k1 == n:
+                break
+            # U12 = L11^-1 A12, L11 is unit lower triangular
+            L11 = np.tril(LU[k0:k1, k0:k1], -1) + np.eye(k1 - k0, dtype=dtype)
+            LU[k0:k1, k1:] = np.linalg.solve(L11, LU[k0:k1, k1:])
+            L21, U12 = LU[k1:, k0:k1], LU[k0:k1, k1:]
+
+            def update(r0, c0):
+                LU[r0:r0 + block, c0:c0 + block] -= L21[r0 - k1:r0 - k1 + block] @ U12[:, c0 - k1:c0 - k1 + block]
+
+            tiles = [pool.submit(update, r0, c0)
+                     for r0 in range(k1, n, block) for c0 in range(k1, n, block)]
+            for tile in tiles:
+                tile.result()
+    return LU, perm
+
+
+def _lu_solve(LU, perm, b, block=128):
+    """
+    Forward and back substitution with factors from `blocked_lu`, block by block
+    :param LU: packed factors
+    :param perm: row permutation
+    :param b: np.ndarray of shape (n, k)
+    :param block: size of diagonal blocks
+    :return: x, np.ndarray of shape (n, k) in precision of LU
+    """
+    n = LU.shape[0]
+    x = b.astype(LU.dtype)[perm]
+    for k0 in range(0, n, block):  # L y = P b
+        k1 = min(k0 + block, n)
+        x[k0:k1] -= LU[k0:k1, :k0] @ x[:k0]
+        x[k0:k1] = np.linalg.solve(np.tril(LU[k0:k1, k0:k1], -1) + np.eye(k1 - k0, dtype=LU.dtype),
+                                   x[k0:k1])
+    for k0 in reversed(range(0, n, block)):  # U x = y
+        k1 = min(k0 + block, n)
+        x[k0:k1] -= LU[k0:k1, k1:] @ x[k1:]
+        x[k0:k1] = np.linalg.solve(np.triu(LU[k0:k1, k0:k1]), x[k0:k1])
+    return x
+
+
+def solve_blocked(A, b, block=128, workers=None):
+    """
+    Solve SOLE for large dense systems: multi-threaded `blocked_lu`, then
+    forward and back substitution block by block
+    :param A: square Matrix or np.ndarray
+    :param b: Matrix or np.ndarray of shape (n, k), or 1-d array
+    :param block: panel width of the factorization
+    :param workers: number of threads, all cores by default
+    :return: x, np.ndarray of the shape of b (Matrix if b is a Matrix)
+    """
+    LU, perm = blocked_lu(A, block=block, workers=workers)
+    b_arr = np.asarray(b, dtype=np.float64)
+    x = _lu_solve(LU, perm, b_arr.reshape(LU.shape[0], -1), block)
+    if isinstance(b, Matrix):
+        return Matrix.from_buffer(x)
+    return x.reshape(b_arr.shape)
+
+
+def _out_of_core_plan(n, memory, block):
+    """
+    Panel width and tile side which keep the working set under <memory> bytes.
+    A panel of n x w doubles takes at most a quarter of it. numpy operations on
+    strided slices stage their operands in buffers of up to three times the
+    size of the operation, so every step works on pieces of at most side^2
+    elements: a step costs no more than 8 side^2 doubles (an update with its
+    buffers, a block of L, a block of U and copies made by np.linalg.solve),
+    half of the limit. Objects of the file and numpy itself take a few dozen
+    kilobytes more.
+    :param n: number of equations
+    :param memory: bytes
+    :param block: largest panel width
+    :return: (panel width, tile side)
+    """
+    side = isqrt(memory // 128)
+    width = min(block, side, memory // (32 * n))
+    if width < 1:
+        raise ValueError(f"Memory limit of {memory} bytes is too small for {n} equations")
+    return width, side
+
+
+def solve_out_of_core(A, b, out=None, memory=1 << 26, block=128, workdir=None):
+    """
+    Solve SOLE which doesn't fit in memory. The augmented matrix [A | b] is copied
+    into a memory-mapped temporary file and eliminated there panel by panel
+    (right-looking LU with partial pivoting): a panel of columns is factored in
+    memory, then row swaps and the update of the trailing submatrix are applied
+    tile by tile. Back substitution goes by blocks of rows and writes the
+    solution straight to <out>. Pieces of the matrix, together with the
+    temporaries of their updates, take at most <memory> bytes at a time (besides
+    the solution), the rest stays in the file (and the page cache). Pivots not
+    larger than n * eps * max|A| make the matrix singular (ValueError), as in
+    blocked_lu.
+    :param A: square Matrix, np.ndarray, np.memmap or path to .npy file
+    :param b: Matrix, np.ndarray, np.memmap or path to .npy file of shape (n, k), or 1-d
+    :param out: path of .npy file to write the solution to, or None to return it in memory
+    :param memory: working set limit in bytes
+    :param block: largest panel width
+    :param workdir: directory for the temporary file, system default if None
+    :return: x of the shape of b: np.memmap of <out>, np.ndarray, or Matrix if b is a Matrix
+    """
+    if isinstance(A, (str, os.PathLike)):
+        A = np.load(A, mmap_mode='r')
+    if isinstance(b, (str, os.PathLike)):
+        b = np.load(b, mmap_mode='r')
+    n = A.shape[0]
+    if A.shape != (n, n):
+        raise ValueError("Out-of-core solver expects a square matrix")
+    width, side = _out_of_core_plan(n, memory, block)
+    b_shape = (n, 1) if len(b.shape) == 1 else b.shape
+    ncol = n + b_shape[1]
+    with tempfile.NamedTemporaryFile(dir=workdir, suffix='.aug') as f:
+        M = np.memmap(f, dtype=np.float64, mode='w+', shape=(n, ncol))
+        step = max(1, side * side // ncol)
+        scale = 0.
+        for r0 in range(0, n, step):  # copy [A | b] by bands of rows, finding max|A| on the way
+            r1 = min(r0 + step, n)
+            band = np.asarray(A[r0:r1, :], dtype=np.float64)
+            scale = max(scale, band.max(initial=0), -band.min(initial=0))
+            M[r0:r1, :n] = band
+            M[r0:r1, n:] = np.asarray(b[r0:r1], dtype=np.float64).reshape(r1 - r0, -1)
+        tol = n * np.finfo(np.float64).eps * scale  # pivot smaller than rounding error counts as zero
+
+        for k0 in range(0, n, width):
+            k1 = min(k0 + width, n)
+            rows = max(1, side * side // (k1 - k0))  # the panel is copied and updated by bands of rows
+            panel = np.empty((n - k0, k1 - k0), order='F')  # columns of pivot candidates are contiguous
+            for r0 in range(0, n - k0, rows):
+                panel[r0:r0 + rows] = M[k0 + r0:k0 + r0 + rows, k0:k1]
+            swaps = []
+            for j in range(k1 - k0):  # factor the panel in memory
+                p = j + int(np.argmax(np.abs(panel[j:, j])))
+                if abs(panel[p, j]) <= tol:
+                    raise ValueError("Matrix is singular")
+                if p != j:
+                    panel[[j, p]] = panel[[p, j]]
+                    swaps.append((k0 + j, k0 + p))
+                panel[j + 1:, j] /= panel[j, j]
+                for r0 in range(j + 1, len(panel), rows):
+                    panel[r0:r0 + rows, j + 1:] -= np.outer(panel[r0:r0 + rows, j], panel[j, j + 1:])
+            for r0 in range(0, n - k0, rows):
+                M[k0 + r0:k0 + r0 + rows, k0:k1] = panel[r0:r0 + rows]
+            L11 = np.tril(panel[:k1 - k0], -1) + np.eye(k1 - k0)
+            L21 = panel[k1 - k0:]
+            for c0 in range(k1, ncol, side):  # swap rows, then U12 = L11^-1 A12 and A22 -= L21 U12
+                c1 = min(c0 + side, ncol)
+                for i, p in swaps:
+                    M[[i, p], c0:c1] = M[[p, i], c0:c1]
+                U12 = np.linalg.solve(L11, M[k0:k1, c0:c1])
+                M[k0:k1, c0:c1] = U12
+                for r0 in range(k1, n, side):
+                    r1 = min(r0 + side, n)
+                    M[r0:r1, c0:c1] -= L21[r0 - k1:r1 - k1] @ U12
+            M.flush()
+
+        if out is None:
+            x = np.empty(b_shape)
+        else:  # .npy keeps the shape of b, x is a (n, k) view of it
+            x_file = np.lib.format.open_memmap(out, mode='w+', dtype=np.float64, shape=b.shape)
+            x = x_file.reshape(b_shape)
+        for k0 in reversed(range(0, n, side)):  # U x = y, by blocks of rows from the bottom
+            k1 = min(k0 + side, n)
+            y = np.array(M[k0:k1, n:])
+            for c0 in range(k1, n, side):
+                y -= M[k0:k1, c0:min(c0 + side, n)] @ x[c0:c0 + side]
+            x[k0:k1] = np.linalg.solve(np.triu(M[k0:k1, k0:k1]), y)
+        del M
+    if out is not None:
+        x_file.flush()
+        return x_file
+    if isinstance(b, Matrix):
+        return Matrix.from_buffer(np.array(x))
+    return x.reshape(b.shape)
+
+
+# x: solution, residual: backward error ||b - A x|| / (||A|| ||x|| + ||b||) (inf-norms),
+# iterations: refinement steps, fallback: whether float64 factorization had to be used
+MixedResult = namedtuple('MixedResult', ['x', 'residual', 'iterations', 'fallback'])
+
+
+def solve_mixed(A, b, max_iter=30, block=128, workers=None):
+    """
+    Mixed-precision solve: LU factorization (the O(n^3) part) in float32, then
+    iterative refinement x <- x + A^-1 (b - A x) with residuals in float64 and
+    corrections from float32 factors, O(n^2) each. Accuracy reaches float64
+    for reasonably conditioned matrices; otherwise falls back to float64 LU.
+    Matrix with a pivot not larger than n * eps * max|A| raises ValueError:
+    the backward error of such a solution would look small, but it's garbage.
+    :param A: square Matrix or np.ndarray
+    :param b: Matrix or np.ndarray of shape (n, k), or 1-d array
+    :param max_iter: refinement steps before falling back to float64
+    :param block: panel width of the factorization
+    :param workers: number of threads of the factorization
+    :return: MixedResult, x of the shape of b (Matrix if b is a Matrix)
+    """
+    A64 = np.asarray(A, dtype=np.float64)
+    b64 = np.asarray(b, dtype=np.float64)
+    n = A64.shape[0]
+    rhs = b64.reshape(n, -1)
+    norm_A = np.abs(A64).sum(axis=1).max(initial=0)
+    eps = np.finfo(np.float64).eps * sqrt(n)  # same stopping rule as LAPACK dsgesv
+
+    def backward_error(x, r):
+        return np.abs(r).max(initial=0) / (norm_A * np.abs(x).max(initial=0) + np.abs(rhs).max(initial=0) or 1)
+
+    fallback, iterations, x = True, 0, None
+    with np.errstate(over='ignore', invalid='ignore'):  # float32 may overflow, it's checked below
+        try:
+            # singularity is judged in float64, refinement copes with float32 rounding
+            LU, perm = blocked_lu(A64, block=block, workers=workers, dtype=np.float32,
+                                  tol=n * np.finfo(np.float64).eps * np.abs(A64).max(initial=0))
+            x = _lu_solve(LU, perm, rhs, block).astype(np.float64)
+        except ValueError:  # singular in float32
+            pass
+        while x is not None and np.all(np.isfinite(x)):
+            r = rhs - A64 @ x
+            if backward_error(x, r) <= eps:
+                fallback = False
+                break
+            if iterations == max_iter:
+                break
+            x += _lu_solve(LU, perm, r, block)
+            iterations += 1
+    if fallback:
+        LU, perm = blocked_lu(A64, block=block, workers=workers)
+        x = _lu_solve(LU, perm, rhs, block)
+    residual = float(backward_error(x, rhs - A64 @ x))
+    x = Matrix.from_buffer(x) if isinstance(b, Matrix) else x.reshape(b64.shape)
+    return MixedResult(x, residual, iterations, fallback)
+
+
+def solve_batched(A, b):
+    """
+    Solve a stack of independent small systems at once: Gaussian elimination
+    with partial pivoting runs on all systems simultaneously, every row
+    operation is one numpy operation over the batch dimension.
+    :param A: coefficients, array-like of shape (batch, n, n)
+    :param b: right-hand sides of shape (batch, n, k) or (batch, n)
+    :return: (x, unique): solutions of the shape of b and boolean mask of
+        systems with unique solution; singular systems get nan solutions
+    """
+    A = np.array(A, dtype=np.float64)
+    b = np.array(b, dtype=np.float64)
+    batch, n = A.shape[:2]
+    if A.shape != (batch, n, n) or b.shape[:2] != (batch, n):
+        raise ValueError(f"Expected shapes (batch, n, n) and (batch, n, k), got {A.shape} and {b.shape}")
+    shape = b.shape
+    b = b.reshape(batch, n, -1)
+    systems = np.arange(batch)
+    # pivot smaller than rounding error of the matrix entries counts as zero
+    tol = n * np.finfo(np.float64).eps * np.abs(A).max(axis=(1, 2), initial=0)
+    singular = np.zeros(batch, dtype=bool)
+    for k in range(n):
+        p = k + np.argmax(np.abs(A[:, k:, k]), axis=1)  # pivot row of every system
+        for M in (A, b):
+            row_k = M[systems, k].copy()
+            M[systems, k] = M[systems, p]
+            M[systems, p] = row_k
+        pivot = A[:, k, k]
+        singular |= np.abs(pivot) <= tol
+        factors = A[:, k + 1:, k] / np.where(singular, 1, pivot)[:, None]
+        A[:, k + 1:, k:] -= factors[:, :, None] * A[:, None, k, k:]
+        b[:, k + 1:] -= factors[:, :, None] * b[:, None, k]
+    x = np.empty_like(b)
+    diagonal = np.where(singular[:, None], 1, np.diagonal(A, axis1=1, axis2=2))
+    for k in range(n - 1, -1, -1):
+        x[:, k] = (b[:, k] - np.einsum('bj,bjk->bk', A[:, k, k + 1:], x[:, k + 1:])) / diagonal[:, k, None]
+    x[singular] = np.nan
+    return x.reshape(shape), ~singular
+
+
+# x: solution, converged: whether tolerance was reached,
+# history: relative residual ||b - A x|| / ||b|| before every iteration and at the end
+IterativeResult = namedtuple('IterativeResult', ['x', 'converged', 'iterations', 'history'])
+
+
+def _as_vector(v, n):
+    """
+    Vector (right-hand side or initial guess) as a list of n floats
+    :param v: Matrix of shape (n, 1) or (1, n), np.ndarray or list
+    :param n: expected length
+    :return: (list, function converting list back to the type and shape of v)
+    """
+    V = Matrix._operand(v)
+    if V.shape == (n, 1):
+        values = V.T._row(0)
+    elif V.shape == (1, n):
+        values = V._row(0)
+    else:
+        raise ValueError(f"Expected vector of length {n}, got shape {V.shape}")
+    if isinstance(v, Matrix):
+        return values, lambda x: Matrix([x]) if V.shape[0] == 1 else Matrix([x]).T
+    if isinstance(v, np.ndarray):
+        return values, lambda x: np.array(x).reshape(v.shape)
+    return values, list
+
+
+def _iterative_setup(A, b, x0):
+    """
+    Common preparation of iterative solvers
+    :return: (CSRMatrix, b list, x list, function converting x to the type of b, ||b||)
+    """
+    if not isinstance(A, CSRMatrix):
+        A = CSRMatrix.from_dense(A)
+    n = A.shape[0]
+    if A.shape[1] != n:
+        raise ValueError("Iterative solvers require square matrix, got", A.shape)
+    b, to_result = _as_vector(b, n)
+    x = [0.0] * n if x0 is None else _as_vector(x0, n)[0]
+    norm_b = sqrt(sum(v * v for v in b)) or 1.0
+    return A, b, x, to_result, norm_b
+
+
+def _split_diagonal(A):
+    """
+    Diagonal and off-diagonal elements of every row
+    :param A: square CSRMatrix
+    :return: (diagonal list, list of (columns, values) without the diagonal)
+    """
+    diagonal, rows = [], []
+    for i in range(A.shape[0]):
+        cols, vals = A.row(i)
+        off = [(j, v) for j, v in zip(cols, vals) if j != i]
+        d = A[i, i]
+        if d == 0:
+            raise ValueError(f"Zero on the diagonal in row {i}")
+        diagonal.append(d)
+        rows.append(([j for j, _ in off], [v for _, v in off]))
+    return diagonal, rows
+
+
+def _residual(A, b, x):
+    """
+    b - A x
+    """
+    return [bi - ax for bi, ax in zip(b, A.matvec(x))]
+
+
+def _norm(v):
+    return sqrt(sum(vi * vi for vi in v))
+
+
+def solve_jacobi(A, b, x0=None, tol=1e-8, max_iter=1000):
+    """
+    Jacobi iteration x <- x + D^-1 (b - A x), converges for diagonally
+    dominant matrices. Work per iteration is proportional to nonzeros of A.
+    :param A: square Matrix, np.ndarray or CSRMatrix
+    :param b: right-hand side vector
+    :param x0: initial guess (e.g. solution of a similar system), zeros by default
+    :param tol: stop when ||b - A x|| <= tol * ||b||
+    :param max_iter: maximum number of iterations
+    :return: IterativeResult, x of the type of b
+    """
+    A, b, x, to_result, norm_b = _iterative_setup(A, b, x0)
+    diagonal, _ = _split_diagonal(A)
+    history = []
+    for k in range(max_iter + 1):
+        r = _residual(A, b, x)
+        history.append(_norm(r) / norm_b)
+        if history[-1] <= tol or k == max_iter:
+            break
+        x = [xi + ri / d for xi, ri, d in zip(x, r, diagonal)]
+    return IterativeResult(to_result(x), history[-1] <= tol, k, history)
+
+
+def solve_sor(A, b, omega=1.0, x0=None, tol=1e-8, max_iter=1000):
+    """
+    Successive over-relaxation: Gauss-Seidel sweep (new values are used as
+    soon as they are computed) blended with the previous value by <omega>.
+    omega=1 is plain Gauss-Seidel, 1 < omega < 2 speeds up convergence for
+    SPD matrices.
+    :param A: square Matrix, np.ndarray or CSRMatrix
+    :param b: right-hand side vector
+    :param omega: relaxation factor, 0 < omega < 2
+    :param x0: initial guess, zeros by default
+    :param tol: stop when ||b - A x|| <= tol * ||b||
+    :param max_iter: maximum number of sweeps
+    :return: IterativeResult, x of the type of b
+    """
+    if not 0 < omega < 2:
+        raise ValueError("SOR diverges unless 0 < omega < 2, got", omega)
+    A, b, x, to_result, norm_b = _iterative_setup(A, b, x0)
+    diagonal, rows = _split_diagonal(A)
+    get = x.__getitem__
+    history = []
+    for k in range(max_iter + 1):
+        history.append(_norm(_residual(A, b, x)) / norm_b)
+        if history[-1] <= tol or k == max_iter:
+            break
+        for i, (cols, vals) in enumerate(rows):
+            s = sum(map(mul, vals, map(get, cols)))
+            x[i] += omega * ((b[i] - s) / diagonal[i] - x[i])
+    return IterativeResult(to_result(x), history[-1] <= tol, k, history)
+
+
+def solve_gauss_seidel(A, b, x0=None, tol=1e-8, max_iter=1000):
+    """
+    Gauss-Seidel iteration, see `solve_sor`
+    """
+    return solve_sor(A, b, omega=1.0, x0=x0, tol=tol, max_iter=max_iter)
+
+
+def solve_cg(A, b, x0=None, tol=1e-8, max_iter=None):
+    """
+    Conjugate gradient method for symmetric positive definite matrices,
+    in exact arithmetic converges in at most n iterations.
+    :param A: square SPD Matrix, np.ndarray or CSRMatrix
+    :param b: right-hand side vector
+    :param x0: initial guess, zeros by default
+    :param tol: stop when ||b - A x|| <= tol * ||b||
+    :param max_iter: maximum number of iterations, 10 n by default
+    :return: IterativeResult, x of the type of b
+    """
+    A, b, x, to_result, norm_b = _iterative_setup(A, b, x0)
+    if max_iter is None:
+        max_iter = 10 * len(b)
+    r = _residual(A, b, x)
+    p = r[:]
+    rr = sum(ri * ri for ri in r)
+    history = [sqrt(rr) / norm_b]
+    k = 0
+    while history[-1] > tol and k < max_iter:
+        Ap = A.matvec(p)
+        pAp = sum(map(mul, p, Ap))
+        if pAp <= 0:
+            raise ValueError("Matrix is not positive definite")
+        alpha = rr / pAp
+        x = [xi + alpha * pi for xi, pi in zip(x, p)]
+        r = [ri - alpha * api for ri, api in zip(r, Ap)]
+        rr, rr_old = sum(ri * ri for ri in r), rr
+        p = [ri + rr / rr_old * pi for ri, pi in zip(r, p)]
+        history.append(sqrt(rr) / norm_b)
+        k += 1
+    return IterativeResult(to_result(x), history[-1] <= tol, k, history)
 
 
 def gauss_inv(A):
     """
-    Calculate inverse of matrix using Gaussian elimination on matrix A,
-    expanded with identity matrix
-    :param A:
-    :return:
+    Calculate inverse of matrix using LU factorization with partial pivoting,
+    solving for columns of identity matrix
+    :param A: Matrix or np.ndarray
+    :return: inverse of the same type as A
     """
     if A.shape[0] != A.shape[1]:
         raise ValueError("Inverse of non-square matrix")
-    X, A_inv = solve_gauss(A, np.eye(A.shape[0]))
-    return A_inv
+    if isinstance(A, Matrix) and A._cache is not None:
+        return A.memo('inverse', lambda: _lu(A).inverse()).copy()  # the caller may modify it
+    return LUFactorization(A).inverse()
+
+
+def _lu(A):
+    """
+    LUFactorization of A, memoized if A is a Matrix with cache enabled
+    :param A: square Matrix or np.ndarray
+    :return: LUFactorization
+    """
+    if isinstance(A, Matrix):
+        return A.memo('lu', lambda: LUFactorization(A))
+    return LUFactorization(A)
+
+
+def rank(A, tol=None):
+    """
+    Rank of a matrix: number of nonzero rows of its row echelon form, found by
+    Gaussian elimination with partial pivoting (memoized if A is a Matrix with
+    cache enabled)
+    :param A: Matrix or np.ndarray
+    :param tol: elements not larger than tol in absolute value are zeros,
+        max(shape) * eps * max|A| by default
+    :return: int
+    """
+    def compute():
+        X, _ = _as_matrix(A)
+        nrow, ncol = X.shape
+        if not nrow or not ncol:
+            return 0
+        eps = tol
+        if eps is None:
+            eps = max(nrow, ncol) * np.finfo(np.float64).eps * max(abs(v) for row in X.values for v in row)
+        r = 0
+        for c in range(ncol):
+            if r == nrow:
+                break
+            col = X[r:, c]._row(0)
+            p = r + max(range(nrow - r), key=lambda i: abs(col[i]))
+            if abs(X[p, c]) <= eps:
+                continue
+            if p != r:
+                X[r, :], X[p, :] = X[p, :].copy(), X[r, :].copy()
+            for i in range(r + 1, nrow):
+                if X[i, c] != 0:
+                    X[i, :].axpy(-X[i, c] / X[r, c], X[r, :])
+            r += 1
+        return r
+    return A.memo(('rank', tol), compute) if isinstance(A, Matrix) else compute()
 
 
 def parse_assignment():
@@ -67,6 +812,120 @@ def parse_assignment():
     return Matrix(parsed)
 
 
+class _NumberReader:
+    """
+    Reads lines from a sequence of byte chunks. The buffer is only advanced by
+    an offset while it is parsed, the unparsed rest is moved to the front when
+    the next chunk is appended.
+    """
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buf = b''
+        self._pos = 0  # start of the unparsed rest of the buffer
+        self._eof = False
+
+    def _fill(self):
+        """
+        Append next chunk to the unparsed rest of the buffer
+        :return: False at the end of input
+        """
+        chunk = next(self._chunks, b'')
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def line(self):
+        """
+        Next non-empty line
+        :return: bytes, None at the end of input
+        """
+        while True:
+            end = self._buf.find(b'\n', self._pos)
+            if end != -1:
+                line, self._pos = self._buf[self._pos:end], end + 1
+                if line.strip():
+                    return line
+            elif not self._fill():
+                line, self._pos = self._buf[self._pos:], len(self._buf)
+                return line if line.strip() else None
+
+
+def _read_chunks(source, chunk_size):
+    """
+    Contents of a stream or a file in chunks of bytes. Files are
+    memory-mapped, so only pages around the current chunk are read
+    :param source: path, binary file object or None for sys.stdin.buffer
+    :param chunk_size: bytes per chunk
+    :return: generator of bytes
+    """
+    if source is None:
+        source = sys.stdin.buffer
+    if not hasattr(source, 'read'):
+        with open(source, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for start in range(0, len(mm), chunk_size):
+                    yield mm[start:start + chunk_size]
+        return
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_systems(source=None, chunk_size=1 << 24):
+    """
+    Bulk reader of the assignment format: number of equations, then one row
+    of coefficients and the free term per line. Input may hold many systems
+    one after another. Numbers go straight into one contiguous array('d') per
+    system, which the Matrix uses without re-validation. A row longer or
+    shorter than the first one raises ValueError.
+    :param source: path (memory-mapped), binary file object or None for stdin
+    :param chunk_size: bytes read at once
+    :return: generator of Matrix
+    """
+    reader = _NumberReader(_read_chunks(source, chunk_size))
+    while True:
+        line = reader.line()
+        if line is None:
+            return
+        nrow = int(line)
+        if nrow <= 0:
+            yield Matrix()
+            continue
+        buf = ncol = None
+        for r in range(nrow):  # a row per line, the first one sets the length
+            line = reader.line()
+            if line is None:
+                raise ValueError(f"Unexpected end of input, {nrow - r} more rows expected")
+            row = array('d', map(float, line.split()))
+            if buf is None:
+                ncol = len(row)
+                buf = array('d', bytes(8 * nrow * ncol))
+            elif len(row) != ncol:
+                raise ValueError(f"Row {r} differs in length")
+            buf[r * ncol:(r + 1) * ncol] = row
+        if _instruments:
+            _record('read', 1, nrow * ncol, 8 * nrow * ncol)
+        yield Matrix._view(buf, (nrow, ncol), (ncol, 1))
+
+
+def read_assignment(source=None):
+    """
+    Fast replacement of `parse_assignment`: read one system with `read_systems`
+    :param source: path, binary file object or None for stdin
+    :return: Matrix
+    """
+    for M in read_systems(source):
+        return M
+    raise ValueError("Input is empty")
+
+
 def split_input(M):
     """
     Split input matrix into matrix of coefficients X and vector of constant
@@ -96,6 +955,27 @@ def output_result(X, b):
 
 
 if __name__ == '__main__':
-    X, b = split_input(parse_assignment())
-    A, b_solved = solve_gauss(X, b.T)
-    output_result(A, b_solved)
+    parser = argparse.ArgumentParser(description="Solve system of linear equations read from stdin")
+    parser.add_argument('path', nargs='?',
+                        help="read input from file (memory-mapped) instead of stdin")
+    parser.add_argument('--batch', action='store_true',
+                        help="input holds many systems one after another, solve all of them")
+    parser.add_argument('--mixed', action='store_true',
+                        help="float32 factorization with float64 iterative refinement")
+    args = parser.parse_args()
+    if args.batch or args.path or not sys.stdin.isatty():  # bulk reader unless typed in
+        systems = read_systems(args.path)
+        if not args.batch:
+            systems = islice(systems, 1)
+    else:
+        systems = [parse_assignment()]
+    for M in systems:
+        X, b = split_input(M)
+        if args.mixed:
+            try:
+                output_result(eye(X.shape[0]), solve_mixed(X, b.T).x)
+            except ValueError:  # singular or not square
+                print(-1)
+        else:
+            A, b_solved = solve_gauss(X, b.T)
+            output_result(A, b_solved)
@@ -1,5 +1,10 @@
-from Matrix import Matrix
-import collections
+from array import array
+from bisect import bisect_left
+from heapq import heapify, heappop, heappush
+from itertools import accumulate
+from operator import mul
+from Matrix import Matrix, _instruments, _record
+import collections.abc
 
 
 def eye(n):
@@ -28,11 +33,30 @@ def zeros(shape):
     :return:
     """
     if type(shape) is int:
-        return Matrix([[0 for _ in range(shape)] for _ in range(shape)])
-    elif isinstance(shape, collections.Sequence) and len(shape) == 2:
-        return Matrix([[0 for _ in range(shape[1])] for _ in range(shape[0])])
-    else:
+        shape = shape, shape
+    elif not (isinstance(shape, collections.abc.Sequence) and len(shape) == 2):
         raise ValueError("Don't understand input shape:", shape)
+    nrow, ncol = shape
+    if _instruments:
+        _record('zeros', 1, 0, 8 * nrow * ncol)
+    # zero bytes are 0.0 in IEEE 754, so the buffer is allocated in one go
+    return Matrix._view(array('d', bytes(8 * nrow * ncol)), (nrow, ncol), (ncol, 1))
+
+
+def dot(A, B, block=64, use_numpy=None):
+    """
+    Matrix product of A and B
+    :param A: Matrix
+    :param B: Matrix
+    :param block: number of columns of B multiplied at once by pure Python kernel
+    :param use_numpy: True/False to force/forbid numpy, None to decide by size
+    :return: Matrix
+    """
+    if not isinstance(A, Matrix):
+        A = Matrix(A)
+    if not isinstance(B, Matrix):
+        B = Matrix(B)
+    return A._matmul(B, block=block, use_numpy=use_numpy)
 
 
 def argmax(A, axis=0):
@@ -42,6 +66,12 @@ def argmax(A, axis=0):
     :param axis: 0 for row index, 1 for column index, 2 for (row, col) tuple
     :return: index (-1 in case of error)
     """
+    if isinstance(A, Matrix):  # memoized if A has cache enabled
+        return A.memo(('argmax', axis), lambda: _argmax(A, axis))
+    return _argmax(A, axis)
+
+
+def _argmax(A, axis):
     max_row, max_col, max_val = -1, -1, None
     if type(A) in (list, tuple):  # instead of failing miserably, find proper index
         for i, v in enumerate(A):
@@ -79,6 +109,260 @@ def argmax(A, axis=0):
         return max_row, max_col
 
 
+class CSRMatrix:
+    """
+    Sparse matrix in compressed sparse row format: column indices and values
+    of nonzero elements of row i are stored in indices[indptr[i]:indptr[i + 1]]
+    and data[indptr[i]:indptr[i + 1]], memory is proportional to the number
+    of nonzeros. CSR of the transpose (`T`) is the CSC form of the matrix.
+    """
+    def __init__(self, data, indices, indptr, shape):
+        """
+        :param data: values of nonzero elements, row by row
+        :param indices: column index of every value
+        :param indptr: start of every row in data/indices, plus the total length
+        :param shape: (nrow, ncol)
+        """
+        if len(indptr) != shape[0] + 1 or len(data) != len(indices) or indptr[-1] != len(data):
+            raise ValueError("Inconsistent CSR arrays for shape", shape)
+        self.data = array('d', data)
+        self.indices = array('q', indices)
+        self.indptr = array('q', indptr)
+        self.shape = tuple(shape)
+        if _instruments:
+            _record('csr', 0, len(self.data), 16 * len(self.data) + 8 * len(self.indptr))
+
+    @classmethod
+    def from_coo(cls, rows, cols, values, shape):
+        """
+        Build from coordinate triplets, duplicates are summed
+        :param rows: row index of every element
+        :param cols: column index of every element
+        :param values: values
+        :param shape: (nrow, ncol)
+        :return: CSRMatrix
+        """
+        row_dicts = [{} for _ in range(shape[0])]
+        for i, j, v in zip(rows, cols, values):
+            if not (0 <= i < shape[0] and 0 <= j < shape[1]):
+                raise ValueError(f"Index [{i}, {j}] is out of bounds for shape {shape}")
+            row = row_dicts[i]
+            row[j] = row.get(j, 0) + v
+        return cls._from_row_dicts(row_dicts, shape)
+
+    @classmethod
+    def from_dense(cls, A):
+        """
+        Build from dense matrix, keeping only nonzero elements
+        :param A: Matrix (e.g. output of MatrixParser.parse), list of lists or np.ndarray
+        :return: CSRMatrix
+        """
+        if isinstance(A, Matrix):
+            shape, rows = A.shape, A.values
+        else:
+            rows = A.tolist() if hasattr(A, 'tolist') else A
+            shape = (len(rows), len(rows[0]) if len(rows) else 0)
+        return cls._from_row_dicts([{j: v for j, v in enumerate(row) if v != 0} for row in rows],
+                                   shape)
+
+    @classmethod
+    def _from_row_dicts(cls, row_dicts, shape):
+        """
+        Build from list of {column: value} dictionaries, one per row
+        :param row_dicts:
+        :param shape:
+        :return: CSRMatrix
+        """
+        data, indices, indptr = array('d'), array('q'), array('q', [0])
+        for row in row_dicts:
+            cols = sorted(row)
+            indices.extend(cols)
+            data.extend(map(row.__getitem__, cols))
+            indptr.append(len(indices))
+        return cls(data, indices, indptr, shape)
+
+    @property
+    def nnz(self):
+        """
+        Number of stored elements
+        :return:
+        """
+        return len(self.data)
+
+    def __repr__(self):
+        return f"CSRMatrix(shape={self.shape}, nnz={self.nnz})"
+
+    def row(self, i):
+        """
+        Nonzero elements of i-th row
+        :param i:
+        :return: (column indices, values)
+        """
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def __getitem__(self, item):
+        """
+        A[i, j] -- value of a single element
+        :param item: (row, col)
+        :return:
+        """
+        i, j = item
+        start, end = self.indptr[i], self.indptr[i + 1]
+        pos = bisect_left(self.indices, j, start, end)
+        if pos < end and self.indices[pos] == j:
+            return self.data[pos]
+        return 0.0
+
+    def to_dense(self):
+        """
+        Convert to dense Matrix
+        :return: Matrix
+        """
+        A = zeros(self.shape)
+        for i in range(self.shape[0]):
+            for j, v in zip(*self.row(i)):
+                A[i, j] = v
+        return A
+
+    @property
+    def T(self):
+        """
+        Transpose, i.e. CSC representation of this matrix
+        :return: CSRMatrix
+        """
+        counts = [0] * (self.shape[1] + 1)
+        for j in self.indices:
+            counts[j + 1] += 1
+        indptr = list(accumulate(counts))
+        fill = indptr[:-1]
+        data, indices = array('d', bytes(8 * self.nnz)), array('q', bytes(8 * self.nnz))
+        for i in range(self.shape[0]):
+            for pos in range(self.indptr[i], self.indptr[i + 1]):
+                j = self.indices[pos]
+                data[fill[j]] = self.data[pos]
+                indices[fill[j]] = i
+                fill[j] += 1
+        return CSRMatrix(data, indices, indptr, self.shape[::-1])
+
+    def matvec(self, x):
+        """
+        Product with a vector
+        :param x: sequence of length ncol
+        :return: list of length nrow
+        """
+        data, indices, indptr = self.data, self.indices, self.indptr
+        get = x.__getitem__
+        return [sum(map(mul, data[indptr[i]:indptr[i + 1]], map(get, indices[indptr[i]:indptr[i + 1]])))
+                for i in range(self.shape[0])]
+
+    def __matmul__(self, other):
+        """
+        A @ x for a vector (list or 1-d np.ndarray), giving a list, or
+        A @ B for dense B (Matrix, list of lists or 2-d np.ndarray)
+        :param other:
+        :return: list for a vector, np.ndarray for np.ndarray, Matrix otherwise
+        """
+        if getattr(other, 'ndim', 2) == 1:
+            return self.matvec(other.tolist())
+        if type(other) in (list, tuple) and not (other and hasattr(other[0], '__len__')):
+            return self.matvec(other)
+        B = Matrix._operand(other)
+        if B.shape[0] != self.shape[1]:
+            raise ValueError(f"Shapes {self.shape} and {B.shape} are not aligned")
+        result = zeros((self.shape[0], B.shape[1]))
+        for j in range(B.shape[1]):
+            result.T[j, :] = self.matvec(B.T._row(j))
+        return result if isinstance(other, (Matrix, list, tuple)) else result.__array__()
+
+
+def min_degree_ordering(A):
+    """
+    Fill-reducing ordering of a sparse matrix by approximate minimum degree
+    on the symmetric pattern of A + A^T. Instead of connecting neighbours of
+    an eliminated node into a clique (the fill-in), the node becomes an
+    element of a quotient graph: remaining nodes keep edges to the nodes they
+    share an entry of A with and links to elements, and an element keeps the
+    set of its remaining neighbours. Elements adjacent to the eliminated node
+    are absorbed into the new one, so the graph never outgrows the pattern of A.
+    Nodes with the same neighbours are merged into supervariables and
+    eliminated together. Degree of a node is the approximate external degree
+    of AMD (Amestoy, Davis, Duff), an upper bound computed without set unions.
+    :param A: square CSRMatrix
+    :return: list, order[k] is the original index eliminated at step k
+    """
+    n = A.shape[0]
+    adj = [set() for _ in range(n)]  # remaining (super)variables sharing an entry of A
+    for i in range(n):
+        for j in A.row(i)[0]:
+            if i != j:
+                adj[i].add(j)
+                adj[j].add(i)
+    elements = [set() for _ in range(n)]  # elements the variable belongs to
+    boundary, boundary_weight = {}, {}  # element: its remaining variables, their total weight
+    weight = [1] * n  # number of original nodes in a supervariable
+    members = [[i] for i in range(n)]
+    degree = [len(nbrs) for nbrs in adj]
+    heap = [(d, i) for i, d in enumerate(degree)]
+    heapify(heap)
+    order = []
+    remaining = n
+    while heap:
+        d, p = heappop(heap)
+        if adj[p] is None or d != degree[p]:  # eliminated, merged or outdated entry
+            continue
+        order.extend(members[p])
+        remaining -= weight[p]
+        absorbed = elements[p]
+        pattern = adj[p]  # variables of the new element p
+        for e in absorbed:
+            pattern |= boundary.pop(e)
+            del boundary_weight[e]
+        pattern.discard(p)
+        adj[p] = elements[p] = members[p] = None
+        # weight of Le \ Lp for the other elements of the variables in Lp
+        outside = {}
+        for i in pattern:
+            elements_i = elements[i] = elements[i] - absorbed
+            adj[i] = adj[i] - pattern  # edges inside Lp are represented by the element
+            adj[i].discard(p)
+            for e in elements_i:
+                outside[e] = outside.get(e, boundary_weight[e]) - weight[i]
+        for e, size in outside.items():
+            if size == 0:  # Le is a subset of Lp: absorb e into p
+                for i in boundary.pop(e):
+                    elements[i].discard(e)
+                del boundary_weight[e]
+        # variables of Lp with the same neighbours are indistinguishable from now on
+        buckets = {}
+        for i in pattern:
+            elements[i].add(p)
+            buckets.setdefault((sum(adj[i]) + sum(elements[i]), len(adj[i]), len(elements[i])), []).append(i)
+        for bucket in buckets.values():
+            while len(bucket) > 1:
+                i = bucket.pop()
+                for j in bucket[:]:
+                    if adj[j] == adj[i] and elements[j] == elements[i]:
+                        bucket.remove(j)
+                        weight[i] += weight[j]
+                        members[i] += members[j]
+                        for k in adj[j]:
+                            adj[k].discard(j)
+                        for e in elements[j]:
+                            boundary.get(e, pattern).discard(j)  # p itself isn't in boundary yet
+                        adj[j] = elements[j] = members[j] = None
+        boundary[p] = pattern
+        boundary_weight[p] = size_p = sum(map(weight.__getitem__, pattern))
+        for i in pattern:
+            external = size_p - weight[i]
+            d = sum(map(weight.__getitem__, adj[i])) + external
+            d += sum(outside.get(e, 0) for e in elements[i] if e != p)
+            d = min(remaining - weight[i], degree[i] + external, d)
+            degree[i] = d
+            heappush(heap, (d, i))
+    return order
+
+
 if __name__ == '__main__':
     A = Matrix([[1, 2, 20, 3, -5, 0],
                 [0, 0, 3, -1, 2, 55]])
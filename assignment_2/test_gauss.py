@@ -1,5 +1,14 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
 import numpy as np
-from gauss import solve_gauss, Matrix, eye
+from gauss import solve_gauss, solve_sparse, solve_blocked, solve_batched, \
+    solve_jacobi, solve_gauss_seidel, solve_sor, solve_cg, solve_mixed, read_systems, \
+    solve_out_of_core, rank, gauss_inv, LUFactorization, Matrix, eye
+from matrix_tools import CSRMatrix, min_degree_ordering
 
 
 def test_empty():
@@ -184,3 +193,341 @@ def test_ex6():
     b = Matrix([[11], [-6], [19], [5]])
     A, b_solved = solve_gauss(X, b)
     assert A == eye(4) and b_solved.round(2) == Matrix([[5, -1, 2, 1]]).T
+
+
+def test_numpy_input_untouched():
+    """
+    Integer ndarray inputs are solved in float64 without being modified
+    :return:
+    """
+    a = np.array([[0, 1], [2, 0]])
+    b = np.array([3, 4])
+    X, b_solved = solve_gauss(a, b)
+    assert np.all(a == np.array([[0, 1], [2, 0]])) and np.all(b == np.array([3, 4]))
+    assert np.all(X == np.eye(2)) and np.all(b_solved == np.array([[2], [3]]))
+
+
+def test_complex():
+    """
+    Real operand is promoted to complex when the other one is complex
+    :return:
+    """
+    X, b_solved = solve_gauss(Matrix([[1j, 0], [0, 1]]), Matrix([[1], [2]]))
+    assert X == eye(2) and b_solved == Matrix([[-1j], [2]])
+    X, b_solved = solve_gauss(Matrix([[2, 0], [0, 1]]), Matrix([[1j], [2]]))
+    assert X == eye(2) and b_solved == Matrix([[0.5j], [2]])
+    X, b_solved = solve_gauss(np.array([[1j, 0], [0, 1]]), np.array([1., 2]))
+    assert np.all(X == np.eye(2)) and np.all(b_solved == np.array([[-1j], [2]]))
+    A = Matrix([[1j, 1], [1, 2]])
+    x = LUFactorization(A).solve(Matrix([[1], [2]]))
+    assert x == Matrix([[0], [1]]) and np.allclose((A @ gauss_inv(A)).values, np.eye(2))
+
+
+def test_sparse():
+    """
+    Sparse solver agrees with dense elimination, including zero on the diagonal
+    :return:
+    """
+    X = Matrix([[0, 2, 6],
+                [3, 9, 4],
+                [1, 3, 5]])
+    b = Matrix([[2], [7], [6]])
+    x = solve_sparse(CSRMatrix.from_dense(X), b)
+    assert x.round(2) == Matrix([[7, -2, 1]]).T
+    x = solve_sparse(X, b, ordering=None, pivot_tol=1)
+    assert x.round(2) == solve_gauss(X, b)[1].round(2)
+
+
+def test_sparse_tridiagonal():
+    """
+    Large tridiagonal system from finite differences, solution is known
+    :return:
+    """
+    n = 2000
+    rows, cols, vals = [], [], []
+    for i in range(n):
+        for j, v in ((i - 1, -1), (i, 2), (i + 1, -1)):
+            if 0 <= j < n:
+                rows.append(i)
+                cols.append(j)
+                vals.append(v)
+    A = CSRMatrix.from_coo(rows, cols, vals, (n, n))
+    x_true = np.linspace(0, 1, n)
+    x = solve_sparse(A, np.array(A @ x_true))
+    assert x.shape == (n,) and np.allclose(x, x_true)
+
+
+def test_sparse_grid():
+    """
+    5-point Laplacian on a 2D grid: ordering eliminates every node once and
+    the solution is known
+    :return:
+    """
+    m = 40
+    rows, cols, vals = [], [], []
+    for i in range(m):
+        for j in range(m):
+            for di, dj, v in ((0, 0, 4), (-1, 0, -1), (1, 0, -1), (0, -1, -1), (0, 1, -1)):
+                if 0 <= i + di < m and 0 <= j + dj < m:
+                    rows.append(i * m + j)
+                    cols.append((i + di) * m + j + dj)
+                    vals.append(v)
+    A = CSRMatrix.from_coo(rows, cols, vals, (m * m, m * m))
+    assert sorted(min_degree_ordering(A)) == list(range(m * m))
+    x_true = np.sin(np.arange(m * m))
+    x = solve_sparse(A, np.array(A @ x_true))
+    assert np.allclose(x, x_true)
+
+
+def test_sparse_singular():
+    """
+    Singular sparse system is reported
+    :return:
+    """
+    try:
+        solve_sparse(Matrix([[7, 1], [14, 2]]), Matrix([[-3], [1]]))
+    except ValueError:
+        return
+    assert False
+
+
+def test_lu_many_rhs():
+    """
+    Factor once, solve for several right-hand sides; pivoting handles zero
+    and tiny pivots
+    :return:
+    """
+    X = Matrix([[0, 2, 6],
+                [3, 9, 4],
+                [1, 3, 5]])
+    lu = LUFactorization(X)
+    assert lu.solve(Matrix([[2], [7], [6]])).round(2) == Matrix([[7, -2, 1]]).T
+    assert lu.solve(Matrix([[8, 0], [16, 3], [9, 1]])).round(2) == Matrix([[1, 1], [1, 0], [1, 0]])
+    assert round(lu.det, 8) == -22
+    a = np.array([[1e-20, 1], [1, 1]])
+    x = LUFactorization(a).solve(np.array([1., 2.]))
+    assert np.allclose(x, [[1], [1]])
+
+
+def test_gauss_inv():
+    """
+    Inverse keeps the type of the input, singular matrix is reported
+    :return:
+    """
+    X = Matrix([[3, -1],
+                [-4, 2]])
+    assert (gauss_inv(X) @ X).round(8) == eye(2)
+    a = np.array([[2., 4.], [3., 5.]])
+    assert np.allclose(gauss_inv(a) @ a, np.eye(2))
+    # last pivot is a rounding error, ~1e-16, not an exact zero
+    near_singular = Matrix([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+    assert LUFactorization(near_singular).singular and LUFactorization(near_singular).det == 0
+    for singular in (Matrix([[1, 2], [2, 4]]), near_singular):
+        try:
+            gauss_inv(singular)
+        except ValueError:
+            continue
+        assert False
+
+
+def test_blocked():
+    """
+    Blocked multi-threaded solver with several panels and tiles, including
+    a zero on the diagonal, agrees with numpy
+    :return:
+    """
+    rng = np.random.default_rng(0)
+    a = rng.random((50, 50))
+    a[0, 0] = 0
+    b = rng.random((50, 2))
+    x = solve_blocked(a, b, block=8, workers=3)
+    assert np.allclose(x, np.linalg.solve(a, b))
+    X = Matrix([[1, 2, 1, 0],
+                [5, 2, 4, 1],
+                [2, 1, 2, 1],
+                [3, 2, 2, 1]])
+    b = Matrix([[4], [2], [0], [2]])
+    assert solve_blocked(X, b, block=3).round(2) == Matrix([[0], [2], [0], [-2]])
+
+
+def test_batched():
+    """
+    2x2 examples above solved as one batch, singular ones are flagged
+    :return:
+    """
+    a = np.array([[[3, -1], [-4, 2]],
+                  [[3, 4], [-6, 3]],
+                  [[7, 1], [14, 2]],
+                  [[7, 4], [-2, 5]],
+                  [[2, 4], [3, 5]],
+                  [[1, 2], [2, 4]]])
+    b = np.array([[4, 2], [10, -9], [-3, 1], [-5, 26], [-12, -16], [5, 2]])
+    x, unique = solve_batched(a, b)
+    assert np.all(unique == [True, True, False, True, True, False])
+    assert np.allclose(x[unique], [[5, 11], [2, 1], [-3, 4], [-2, -2]])
+    assert np.all(np.isnan(x[~unique]))
+    rng = np.random.default_rng(0)
+    a = rng.random((100, 8, 8))
+    b = rng.random((100, 8, 3))
+    x, unique = solve_batched(a, b)
+    assert np.all(unique) and np.allclose(x, np.linalg.solve(a, b))
+
+
+def test_iterative():
+    """
+    Jacobi, Gauss-Seidel, SOR and CG converge on diagonally dominant SPD
+    system given as Matrix, np.ndarray or CSRMatrix
+    :return:
+    """
+    X = Matrix([[4, -1, 0],
+                [-1, 4, -1],
+                [0, -1, 4]])
+    b = Matrix([[2], [4], [10]])
+    x_true = Matrix([[1], [2], [3]])
+    for A in (X, np.array(X), CSRMatrix.from_dense(X)):
+        for solve in (solve_jacobi, solve_gauss_seidel, solve_cg):
+            result = solve(A, b, tol=1e-10)
+            assert result.converged and result.x.round(6) == x_true
+            assert len(result.history) == result.iterations + 1 and result.history[-1] <= 1e-10
+    result = solve_sor(X, np.array([2., 4., 10.]), omega=1.1)
+    assert result.converged and np.allclose(result.x, [1, 2, 3])
+    warm = solve_gauss_seidel(X, b, x0=result.x)
+    assert warm.iterations <= 1
+
+
+def test_iterative_not_converged():
+    """
+    Iteration limit is respected and reported
+    :return:
+    """
+    X = Matrix([[1, 3], [2, 1]])  # not diagonally dominant, Jacobi diverges
+    result = solve_jacobi(X, Matrix([[4], [3]]), max_iter=20)
+    assert not result.converged and result.iterations == 20 and len(result.history) == 21
+
+
+def test_mixed():
+    """
+    float32 factorization refined to float64 accuracy; ill-conditioned
+    system falls back to float64 factorization
+    :return:
+    """
+    rng = np.random.default_rng(0)
+    a = rng.random((200, 200)) + 10 * np.eye(200)
+    b = rng.random(200)
+    result = solve_mixed(a, b, block=32)
+    assert not result.fallback and result.residual < 1e-15
+    assert np.allclose(result.x, np.linalg.solve(a, b), rtol=1e-12)
+    hilbert = 1 / (np.arange(12)[:, None] + np.arange(12) + 1)
+    result = solve_mixed(hilbert, hilbert @ np.ones(12), max_iter=5)
+    assert result.fallback and result.iterations == 5 and result.residual < 1e-15
+    X = Matrix([[3, 4],
+                [-6, 3]])
+    b = Matrix([[10], [-9]])
+    assert solve_mixed(X, b).x.round(5) == Matrix([[2], [1]])
+
+
+def test_cli_singular():
+    """
+    Inconsistent system with a near-zero (not exactly zero) pivot prints -1
+    with every solver, solvable one prints the solution
+    :return:
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gauss.py')
+    for flags in ([], ['--mixed']):
+        for data, expected in ((b"3\n1 2 3 1\n4 5 6 2\n7 8 9 4\n", [b'-1']),
+                               (b"3\n1 3 4 3\n2 7 3 -7\n2 8 6 -4\n", [b'4.0', b'-3.0', b'2.0'])):
+            result = subprocess.run([sys.executable, script] + flags, input=data,
+                                    stdout=subprocess.PIPE, check=True)
+            assert result.stdout.split() == expected
+
+
+def test_read_systems():
+    """
+    Several systems in one stream are read the same regardless of how the
+    stream is split into chunks
+    :return:
+    """
+    data = b"2\n3 -1 4\n-4 2 2\n\n3\n1 3 4 3\n2 7 3 -7\n2 8 6 -4.5e0\n1\n-2 4"
+    expected = [Matrix([[3, -1, 4], [-4, 2, 2]]),
+                Matrix([[1, 3, 4, 3], [2, 7, 3, -7], [2, 8, 6, -4.5]]),
+                Matrix([[-2, 4]])]
+    for chunk_size in (1, 3, 7, 1 << 20):
+        systems = list(read_systems(io.BytesIO(data), chunk_size=chunk_size))
+        assert len(systems) == 3 and all(M == E for M, E in zip(systems, expected))
+    # many systems, numbers longer than the reader expects
+    long_number = '0.' + '3' * 60
+    data = f"2\n1 {long_number} 2\n3 4 {long_number}\n".encode() * 500
+    for chunk_size in (5, 1000, 1 << 20):
+        systems = list(read_systems(io.BytesIO(data), chunk_size=chunk_size))
+        assert len(systems) == 500 and all(M == Matrix([[1, 1 / 3, 2], [3, 4, 1 / 3]]) for M in systems)
+    for ragged in (b"2\n1 2 3\n4 5", b"2\n1 2 3\n4 5\n2\n3 -1 4\n-4 2 2\n", b"2\n1 2\n3 4 5\n"):
+        try:  # rows end at line breaks, numbers of the next line aren't borrowed
+            list(read_systems(io.BytesIO(ragged), chunk_size=4))
+        except ValueError:
+            continue
+        assert False
+
+
+def test_out_of_core():
+    """
+    Tiny memory limit splits the system into many panels and tiles
+    :return:
+    """
+    rng = np.random.default_rng(3)
+    a = rng.random((30, 30))
+    b = rng.random((30, 2))
+    expected = solve_gauss(a, b)[1]
+    assert np.allclose(solve_out_of_core(a, b, memory=4096), expected)
+    X = Matrix([[1, 3, 4],
+                [2, 7, 3],
+                [2, 8, 6]])
+    b = Matrix([[3], [-7], [-4]])
+    assert solve_out_of_core(X, b, memory=1024).round(5) == solve_gauss(X, b)[1].round(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, 'x.npy')
+        solve_out_of_core(a, a[:, 0], out=out, memory=4096)
+        assert np.allclose(np.load(out), np.eye(30)[0])
+    for n, memory in ((300, 1 << 18), (600, 1 << 20)):  # peak allocation, temporaries included
+        a = rng.random((n, n)) + n * np.eye(n)
+        b = rng.random((n, 2))
+        solve_out_of_core(a, b, memory=memory)  # imports and caches of numpy are not counted
+        tracemalloc.start()
+        x = solve_out_of_core(a, b, memory=memory)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak <= memory
+        assert np.allclose(a @ x, b)
+    singular = np.array([[1., 2, 3], [4, 5, 6], [7, 8, 9]])  # up to rounding errors, as in solve_gauss
+    for a, b, memory in ((singular, np.array([1., 2, 4]), 1024), (a, b, 100)):
+        try:
+            solve_out_of_core(a, b, memory=memory)
+        except ValueError:
+            continue
+        assert False
+
+
+def test_rank_and_cache():
+    """
+    Rank, inverse and solution on matrix with cache enabled
+    :return:
+    """
+    assert rank(Matrix([[1, 2, 3], [4, 5, 6], [7, 8, 9]])) == 2
+    assert rank(np.array([[0, 0, 1], [0, 0, 2]])) == 1
+    assert rank(Matrix([[]])) == 0
+    X = Matrix([[3, -1],
+                [-4, 2]]).enable_cache()
+    inv = gauss_inv(X)
+    inv[0, 0] = 100  # result is a copy, cache is not spoiled
+    assert gauss_inv(X).round(5) == Matrix([[1, 0.5], [2, 1.5]]) and rank(X) == 2
+    assert solve_gauss(X, Matrix([[4], [2]]))[1].round(5) == Matrix([[5], [11]])
+    X[1, :] = [6, -2]
+    assert rank(X) == 1
+    b = Matrix([[4], [-8]])
+    assert solve_gauss(X, b)[1] == solve_gauss(X.copy(), b)[1]  # singular, eliminated as usual
+    X = Matrix([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+    b = Matrix([[1], [2], [4]])
+    expected = solve_gauss(X.copy(), b)
+    X.enable_cache()
+    result = solve_gauss(X, b)  # round-off pivot of LU, the cache doesn't change the answer
+    assert result[0] == expected[0] and result[1] == expected[1]
+    assert not result[0].round(2) == eye(3)
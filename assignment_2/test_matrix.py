@@ -1,5 +1,13 @@
-from matrix_tools import eye, zeros
-from Matrix import Matrix
+import gc
+import io
+import os
+import pickle
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from matrix_tools import eye, zeros, dot, argmax, CSRMatrix
+from Matrix import Matrix, LazyExpr, lazy, instrument, _find_block
+from MatrixParser import MatrixParser
 
 
 def test_zeros():
@@ -58,3 +66,362 @@ def test_transpose_rectangular():
     A_transpose = Matrix([[1, 3, 5],
                           [2, 4, 6]])
     assert A.T == A_transpose
+
+
+def test_slice_is_view():
+    """
+    Slices, rows and transpose share the buffer with the original matrix,
+    while copy is independent
+    :return:
+    """
+    A = Matrix([[1, 2, 3], [4, 5, 6]])
+    row = A[1, :]
+    col = A[:, 2]
+    A_t = A.T
+    row[0, 0] = 40
+    assert A[1, 0] == 40 and A_t[0, 1] == 40
+    assert col.shape == (1, 2) and col == Matrix([[3, 6]])
+    A_t[2, 0] = 30
+    assert A[0, 2] == 30 and col[0] == 30
+    cpy = A[:, :].copy()
+    cpy[0, 0] = -1
+    assert A[0, 0] == 1
+
+
+def test_strided_view():
+    """
+    Views with steps and negative indices address the right elements
+    :return:
+    """
+    A = Matrix([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]])
+    assert A[::2, ::-2] == Matrix([[4, 2], [12, 10]])
+    assert A[::-1] == Matrix([[9, 10, 11, 12], [5, 6, 7, 8], [1, 2, 3, 4]])
+    assert A[-1, -1] == 12 and A[[2, 0]] == Matrix([[9, 10, 11, 12], [1, 2, 3, 4]])
+    A[1:, 1:3] = Matrix([[0, 0]])
+    assert A == Matrix([[1, 2, 3, 4], [5, 0, 0, 8], [9, 0, 0, 12]])
+
+
+def test_nbytes():
+    """
+    Elements are stored unboxed, 8 bytes per element
+    :return:
+    """
+    A = zeros((4, 5))
+    assert A.nbytes == 4 * 5 * 8
+    assert A[1:3, :].nbytes == 2 * 5 * 8
+
+
+def test_matmul():
+    """
+    Matrix product of rectangular matrices, with and without numpy
+    :return:
+    """
+    A = Matrix([[1, 2, 3], [4, 5, 6]])
+    B = Matrix([[7, 8], [9, 10], [11, 12]])
+    expected = Matrix([[58, 64], [139, 154]])
+    assert A @ B == expected
+    assert dot(A, B, block=1, use_numpy=False) == expected
+    assert dot(A, B, use_numpy=True) == expected
+    assert dot(B.T[::-1], A.T[:, ::-1], use_numpy=True) == dot(B.T[::-1], A.T[:, ::-1], use_numpy=False)
+    assert eye(3) @ A.T == A.T
+
+
+def test_matmul_shape_mismatch():
+    """
+    Product of misaligned matrices is an error
+    :return:
+    """
+    try:
+        Matrix([[1, 2]]) @ Matrix([[1, 2]])
+    except ValueError:
+        return
+    assert False
+
+
+def test_numpy_shared_memory():
+    """
+    Matrix and np.ndarray share memory in both directions
+    :return:
+    """
+    arr = np.arange(6, dtype=np.float64).reshape(2, 3)
+    A = Matrix.from_buffer(arr)
+    A[0, 1] = 10
+    assert A.shape == (2, 3) and arr[0, 1] == 10
+    view = np.asarray(A.T[::-1])
+    assert np.shares_memory(view, arr) and view[0, 1] == arr[1, 2]
+    view[2, 0] = -1
+    assert A[0, 0] == -1
+    B = Matrix([[1.5, 2], [3, 4]])
+    assert np.all(np.asarray(B) == np.array([[1.5, 2], [3, 4]]))
+    assert Matrix.from_buffer(bytearray(16), shape=(2, 1)) == 0
+
+
+def test_inplace_ops():
+    """
+    In-place operators modify the buffer shared with views
+    :return:
+    """
+    A = Matrix([[1, 2], [3, 4]])
+    buf = A._buf
+    A += 1
+    A *= Matrix([[2, 10]])
+    A -= Matrix([[1], [2]])
+    A /= np.array([[1., 2.], [4., 8.]])
+    assert A._buf is buf and A == Matrix([[3, 14.5], [1.5, 6]])
+    row = A[1, :]
+    row -= [1.5, 6]
+    assert A[1, :] == 0
+    N = Matrix.from_buffer(np.arange(1., 10.).reshape(3, 3))  # memoryview buffer, slices are live
+    N /= N[0, :]
+    assert N == Matrix([[1, 1, 1], [4, 2.5, 2], [7, 4, 3]])
+    N -= N[0:1, :]
+    assert N[0, :] == 0 and N[1:, :] == Matrix([[3, 1.5, 1], [6, 3, 2]])
+
+
+def test_axpy():
+    """
+    Fused row update on views of the same matrix and on ndarray rows
+    :return:
+    """
+    A = Matrix([[1, 2, 3], [4, 5, 6]])
+    A[1, :].axpy(-4, A[0, :])
+    assert A == Matrix([[1, 2, 3], [0, -3, -6]])
+    A[:, 0].axpy(0.5, np.array([2., 2.]))
+    assert A[:, 0] == Matrix([[2, 1]])
+    a = np.arange(1., 10.).reshape(3, 3)
+    M = Matrix.from_buffer(a)
+    M[1:, :].axpy(-1, a[:-1])  # ndarray overlapping the target is read before it is written
+    t = M[1:, :]
+    t -= a[:-1]
+    assert M == Matrix([[1, 2, 3], [2, 1, 0], [0, 0, 0]])
+
+
+def test_broadcasting():
+    """
+    Elementwise arithmetic with scalars, row and column vectors, matrices
+    :return:
+    """
+    A = Matrix([[1, 2, 3], [4, 5, 6]])
+    assert A + A == A * 2 and 2 * A == A * 2
+    assert A - Matrix([[1, 2, 3]]) == Matrix([[0, 0, 0], [3, 3, 3]])
+    assert A / Matrix([[1], [2]]) == Matrix([[1, 2, 3], [2, 2.5, 3]])
+    assert Matrix([[10], [20]]) - Matrix([[1, 2]]) == Matrix([[9, 8], [19, 18]])
+    assert 1 - A == -(A - 1) and 6 / A[:, -1] == Matrix([[2, 1]])
+    assert (A / 3).round(2) == Matrix([[0.33, 0.67, 1], [1.33, 1.67, 2]])
+    try:
+        A + Matrix([[1, 2]])
+    except ValueError:
+        return
+    assert False
+
+
+def test_csr():
+    """
+    Conversions between dense Matrix, coordinates and CSR
+    :return:
+    """
+    A = Matrix([[0, 2, 0], [1, 0, 0], [0, 0, 3], [0, 0, 0]])
+    S = CSRMatrix.from_dense(A)
+    assert S.nnz == 3 and S.to_dense() == A and S.T.to_dense() == A.T
+    assert S[0, 1] == 2 and S[3, 2] == 0
+    S2 = CSRMatrix.from_coo([2, 0, 1, 2], [2, 1, 0, 2], [1, 2, 1, 2], (4, 3))
+    assert list(S2.indptr) == list(S.indptr) and S2.to_dense() == A
+    assert S @ [1, 1, 1] == [2, 1, 3, 0] and S @ Matrix([[1], [1], [1]]) == Matrix([[2, 1, 3, 0]]).T
+
+
+def test_lazy():
+    """
+    In lazy mode arithmetic builds expression, which gives the same result
+    as eager computation and is written straight into the assigned view
+    :return:
+    """
+    A = Matrix([[1, 2], [3, 4]])
+    B = Matrix([[10, 20]])
+    with lazy():
+        expr = A + B * 2 - A / 2
+        assert isinstance(expr, LazyExpr) and expr.shape == (2, 2)
+        assert expr == Matrix([[20.5, 41], [21.5, 42]])
+        buf = A._buf
+        A[1, :] -= A[0, :] * 3
+        assert A._buf is buf and A == Matrix([[1, 2], [0, -2]])
+        A[0, :] = -A[0, :] + 1
+    assert A.values == [[0, -1], [0, -2]]
+    # expression reads current values of its operands
+    assert expr.T == Matrix([[20, 39.5], [20, 39]]).T
+
+
+def test_lazy_compiled_once():
+    """
+    Expressions of the same form share the fused function, whatever the
+    scalars and rows are; lazy operands work in axpy and matrix product
+    :return:
+    """
+    A = Matrix([[1, 2], [3, 4]])
+    with lazy():
+        first = A[0, :] * 2 - A[1, :]
+        second = A[1, :] * 5 - A[0, :]
+        assert first == Matrix([[-1, 0]])
+        fused = LazyExpr._fused[first._signature()[0]]
+        assert second == Matrix([[14, 18]]) and LazyExpr._fused[second._signature()[0]] is fused
+        assert (A + A).values == [[2, 4], [6, 8]] and (A + A.T).values == [[2, 5], [5, 8]]
+        C = A.copy()
+        C.axpy(2, A - 1)
+        assert C == Matrix([[1, 4], [7, 10]])
+        assert A @ (A * 1) == A @ A and (A * 1) @ A == A @ A and (A * 1) @ (A * 1) == A @ A
+
+
+def test_parser_feed():
+    """
+    Matrix split into chunks at any position is parsed the same,
+    with signs and exponents
+    :return:
+    """
+    s = "[[1, 2.5]; [-3,2e1];\n [3,+4E-1]]"
+    expected = Matrix([[1, 2.5], [-3, 20], [3, 0.4]])
+    parser = MatrixParser()
+    assert parser.parse(s) == expected
+    for k in range(1, len(s)):
+        parser.feed(s[:k])
+        assert not parser.complete
+        parser.feed(s[k:])
+        assert parser.complete and parser.close() == expected
+    assert parser.parse_file(io.BytesIO(s.encode()), chunk_size=3) == expected
+    try:
+        parser.parse_file(io.StringIO("[[1, 2];\n[3, -]]"), chunk_size=4)
+    except SyntaxError as e:
+        assert "(pos: 14)" in str(e)
+        return
+    assert False
+
+
+def test_parser_engines():
+    """
+    Regex-based engine accepts and rejects the same input as character by
+    character one, with the same messages
+    :return:
+    """
+    inputs = ["[[1, 2]; [3,2];\n [3,4]]", "[]", "[[]]", "[[1,]; [-.5e1, ]]", "[;[1]]",
+              "[[1, 2]; [3 ,4]]", "[[1, 2]; [3, 4 ]]", "[[1, 2]; [.3, 4]]", "[[1, 2]; [3,,4]]",
+              "[[1, 2]; [3, 4e]]", "[[1, 2] [3, 4]]", "[[1, 2]; [3]]", "[[1, 2]; [3, 4]"]
+    for s in inputs:
+        results = []
+        for fast in (False, True):
+            try:
+                results.append(MatrixParser(fast=fast).parse(s).values)
+            except (SyntaxError, ValueError) as e:
+                results.append(str(e))
+        assert results[0] == results[1]
+    for chunks in (["[[1, 2];", " ;[3, 4]]"], ["[[1, 2];", " [3, 4]]"], ["[[1, 2]", "; [3, 4]]"]):
+        # separator before the split, the same as without the split
+        expected = _parse_chunks([''.join(chunks)], fast=False)
+        assert _parse_chunks(chunks, fast=False) == _parse_chunks(chunks, fast=True) == expected
+
+
+def _parse_chunks(chunks, fast):
+    p = MatrixParser(fast=fast)
+    try:
+        for chunk in chunks:
+            p.feed(chunk)
+        return p.close().values
+    except (SyntaxError, ValueError) as e:
+        return str(e)
+
+
+def test_save_load():
+    """
+    Binary format is .npy, loaded matrix is memory-mapped
+    :return:
+    """
+    A = Matrix([[1, 2, 3],
+                [4, 5, 6]])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'A.npy')
+        A[:, 1:].save(path)
+        assert np.array_equal(np.load(path), [[2, 3], [5, 6]])
+        A.save(path)
+        assert Matrix.load(path) == A and Matrix.load(path, mmap_mode=None) == A
+        B = Matrix.load(path, mmap_mode='r+')
+        B[1, :] = 0
+        del B
+        assert np.array_equal(np.load(path), [[1, 2, 3], [0, 0, 0]])
+        np.save(path, np.asfortranarray(np.arange(6, dtype='>i4').reshape(2, 3)))
+        assert Matrix.load(path) == Matrix([[0, 1, 2], [3, 4, 5]])
+        Matrix([[1j, 2]]).save(path)
+        assert Matrix.load(path) == Matrix([[1j, 2]])
+
+
+def _fill_shared(handle, value):
+    handle.attach()[:, :] = value
+
+
+def test_shared():
+    """
+    Workers write disjoint blocks of shared matrix through pickled handles
+    :return:
+    """
+    A = Matrix([[0, 0, 0],
+                [0, 0, 0],
+                [0, 0, 0]]).to_shared()
+    assert len(pickle.dumps(A.handle)) < 100
+    handles = [A[0, :].handle, A[1:, :2].handle, A[1:, 2].handle]
+    with ProcessPoolExecutor(2) as pool:
+        list(pool.map(_fill_shared, handles, [1, 2, 3]))
+    assert A == Matrix([[1, 1, 1],
+                        [2, 2, 3],
+                        [2, 2, 3]])
+    assert A.handle.attach() == A
+    A.handle.unlink()
+    names = [A.handle.name] + [M.handle.name for M in (Matrix([[1, 2]]).to_shared() for _ in range(3))]
+    del A
+    gc.collect()  # blocks are closed with the last matrices on them
+    assert not any(map(_find_block, names))
+    if os.path.exists('/proc/self/maps'):
+        with open('/proc/self/maps') as f:
+            assert not any(name.lstrip('/') in line for line in f for name in names)
+    try:
+        Matrix([[1]]).handle
+    except ValueError:
+        return
+    assert False
+
+
+def test_cache():
+    """
+    Cached results are reused until the matrix is written through any view
+    :return:
+    """
+    A = Matrix([[1, 5],
+                [3, 2]]).enable_cache()
+    calls = []
+    assert A.memo('key', lambda: calls.append(1) or len(calls)) == 1
+    assert A.memo('key', lambda: calls.append(1) or len(calls)) == 1
+    assert A.max() == 5 and argmax(A, axis=2) == (0, 1)
+    A[1, 0] = 7
+    assert A.max() == 7 and argmax(A, axis=2) == (1, 0)
+    row = A[0, :]
+    row += 10
+    assert A.max() == 15 and argmax(A, axis=2) == (0, 1)
+    A[1, :].axpy(10, A[0, :])
+    assert A.max() == 152 and A.memo('key', lambda: calls.append(1) or len(calls)) == 2
+
+
+def test_instrument():
+    """
+    Temporaries of operations are counted only inside the block
+    :return:
+    """
+    A = Matrix([[1, 2],
+                [3, 4]])
+    with instrument() as stats:
+        B = A + 1
+        B[0, :] *= 2
+        C = B.T.copy()
+        with instrument() as inner:
+            zeros((2, 3))
+    assert stats['construct']['matrices'] == 0 and stats['elementwise']['elements'] == 4
+    # B[0, :] *= 2 is a view for __getitem__ and another one for __setitem__
+    assert stats['view'] == {'matrices': 3, 'elements': 0, 'bytes': 0, 'validations': 0}
+    assert stats['copy']['bytes'] == 32 and stats['zeros']['bytes'] == 48
+    assert stats.totals['matrices'] == 6 and inner.totals['matrices'] == 1
+    Matrix([[1]])
+    assert stats.totals['validations'] == 0 and C == Matrix([[4, 4], [6, 5]])
@@ -1,24 +1,169 @@
+import argparse
+import os
 import random as rd
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
 
 
-def permute_chars(s):
+PLANNED_LENGTH = 24  # longer words are rare, and have too many variants to keep
+
+
+def swap_variants(word):
+    """
+    Plan of a word: every result of the swap, in the order of the position
+    :param word: str of 3+ characters
+    :return: tuple of len(word) - 2 strings
+    """
+    return tuple(word[:i - 1] + word[i] + word[i - 1] + word[i + 1:] for i in range(1, len(word) - 1))
+
+
+def plan_cache(max_bytes=1 << 26):
+    """
+    Least recently used plans of words. Words longer than PLANNED_LENGTH are
+    not planned, which bounds the size of an entry: key and variants of 4-byte
+    characters, plus lru_cache bookkeeping.
+    :param max_bytes: memory limit of the cache
+    :return: swap_variants with cache_info() and cache_clear()
+    """
+    if max_bytes < 0:
+        raise ValueError(f"Cache size can't be negative: {max_bytes}")
+    n = PLANNED_LENGTH - 2
+    entry = (n + 1) * sys.getsizeof(chr(0x10000) * PLANNED_LENGTH) + sys.getsizeof(tuple(range(n))) + 200
+    return lru_cache(max_bytes // entry)(swap_variants)
+
+
+def hit_rate(cache):
+    """
+    :param cache: function wrapped by lru_cache
+    :return: share of calls answered from the cache
+    """
+    info = cache.cache_info()
+    calls = info.hits + info.misses
+    return info.hits / calls if calls else 0.
+
+
+def permute_chars(s, rng=rd, cache=None):
+    """
+    Swap a random inner character of every word (3+ characters) with the
+    character before it
+    :param s: text
+    :param rng: random.Random (or the random module)
+    :param cache: cache from plan_cache(), so a repeated word costs a lookup and
+        one random draw; None to swap every word. Draws are the same either way.
+    :return: words joined by single spaces
+    """
     words = s.split()
     for i, word in enumerate(words):
-        word_chars = list(word)
         if len(word) < 3:
             continue
+        if cache is not None and len(word) <= PLANNED_LENGTH:
+            variants = cache(word)
+            words[i] = variants[rng.randrange(len(variants))]  # same draw as randrange(1, len(word) - 1)
+            continue
+        word_chars = list(word)
         n_perm = len(word) // 2
         if n_perm > 1:
             n_perm = 1
         for j in range(n_perm):
-            c_from = rd.choice(word[1:-1])
-            from_i = word.index(c_from)
+            from_i = rng.randrange(1, len(word) - 1)  # position itself, repeated letters are fine
             word_chars[from_i], word_chars[from_i - 1] = word_chars[from_i - 1], word_chars[from_i]
         words[i] = ''.join(word_chars)
     return ' '.join(words)
 
 
+def read_chunks(f, chunk_size=1 << 20):
+    """
+    Read text by chunks of whole lines
+    :param f: text file object
+    :param chunk_size: approximate number of characters in a chunk
+    :return: generator of lists of lines
+    """
+    while True:
+        lines = f.readlines(chunk_size)
+        if not lines:
+            return
+        yield lines
+
+
+process_plans = lru_cache(1)(plan_cache)  # one plan cache per process, kept between chunks
+
+
+def permute_chunk(index, lines, seed, cache_bytes=0):
+    """
+    Permute every line of a chunk. Random generator is seeded by the seed and
+    the number of the chunk, so the output doesn't depend on which worker
+    processes the chunk, nor on the number of workers
+    :param index: number of the chunk in the input
+    :param lines: list of lines
+    :param seed: seed of the whole run
+    :param cache_bytes: memory for per-word plans of this process, 0 to disable
+    :return: permuted text of the chunk, line breaks kept
+    """
+    rng = rd.Random(f'{seed}:{index}')
+    cache = process_plans(cache_bytes) if cache_bytes else None
+    return ''.join(permute_chars(line, rng, cache) + '\n' if line.endswith('\n') else permute_chars(line, rng, cache)
+                   for line in lines)
+
+
+def permute_corpus(src, dst, workers=None, chunk_size=1 << 20, seed=0, cache_bytes=0):
+    """
+    Permute a text of any size chunk by chunk on a process pool, writing
+    results in input order as soon as they are ready. At most 2 chunks per
+    worker are read ahead, so memory doesn't depend on the size of the input.
+    :param src: text file object
+    :param dst: text file object
+    :param workers: number of processes, all cores by default; 1 to run in this process
+    :param chunk_size: approximate number of characters in a chunk
+    :param seed: same seed and input give the same output
+    :param cache_bytes: memory for per-word plans of every process, 0 to disable
+    :return: number of characters read
+    """
+    chunks = enumerate(read_chunks(src, chunk_size))
+    total = 0
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for index, lines in chunks:
+            total += sum(map(len, lines))
+            dst.write(permute_chunk(index, lines, seed, cache_bytes))
+        return total
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for index, lines in chunks:
+            total += sum(map(len, lines))
+            pending.append(pool.submit(permute_chunk, index, lines, seed, cache_bytes))
+            if len(pending) >= 2 * workers:
+                dst.write(pending.popleft().result())
+        while pending:
+            dst.write(pending.popleft().result())
+    return total
+
+
 if __name__ == '__main__':
-    s = input("Enter string to permute:")
-    # s = "Написать программу, которая перемешивает символы в словах заданного текста. При этом текст после перестановок должен оставаться читабельным."
-    print(permute_chars(s))
+    parser = argparse.ArgumentParser(description='Permute characters in words')
+    parser.add_argument('path', nargs='?', help='text file to permute line by line (interactive input if omitted)')
+    parser.add_argument('-o', '--output', help='output file, stdout by default')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, all cores by default')
+    parser.add_argument('--chunk-size', type=int, default=1 << 20, help='characters per chunk')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-mb', type=float, default=0, help='memory for per-word plans of every process')
+    args = parser.parse_args()
+    if args.path is None:
+        s = input("Enter string to permute:")
+        # s = "Написать программу, которая перемешивает символы в словах заданного текста. При этом текст после перестановок должен оставаться читабельным."
+        print(permute_chars(s))
+    else:
+        start = time.perf_counter()
+        with open(args.path, encoding='utf-8') as src, \
+                (open(args.output, 'w', encoding='utf-8') if args.output else nullcontext(sys.stdout)) as dst:
+            cache_bytes = int(args.cache_mb * 2 ** 20)
+            permute_corpus(src, dst, args.workers, args.chunk_size, args.seed, cache_bytes)
+        elapsed = time.perf_counter() - start
+        mb = os.path.getsize(args.path) / 2 ** 20
+        print(f"{mb:.1f} MB in {elapsed:.2f} s, {mb / elapsed:.1f} MB/s", file=sys.stderr)
+        if cache_bytes and args.workers == 1:  # workers keep their own caches
+            plans = process_plans(cache_bytes)
+            print(f"{plans.cache_info()}, hit rate {hit_rate(plans):.1%}", file=sys.stderr)
@@ -0,0 +1,51 @@
+import io
+import random as rd
+from permute_chars import permute_corpus, swap_variants, plan_cache, hit_rate, PLANNED_LENGTH
+
+
+def test_permute_corpus():
+    """
+    Output doesn't depend on the number of workers, keeps lines, and every
+    word of 3+ characters gets exactly one swap of adjacent characters
+    :return:
+    """
+    rng = rd.Random(0)
+    lines = [' '.join(''.join(rng.choices('абвгдabcde', k=rng.randint(1, 9))) for _ in range(rng.randint(0, 12)))
+             for _ in range(300)]
+    text = '\n'.join(lines) + '\n'
+    outputs = []
+    for workers in (1, 2):
+        dst = io.StringIO()
+        assert permute_corpus(io.StringIO(text), dst, workers=workers, chunk_size=256) == len(text)
+        outputs.append(dst.getvalue())
+    assert outputs[0] == outputs[1]
+    result = outputs[0].split('\n')
+    assert len(result) == len(text.split('\n')) and result[-1] == ''
+    for line, permuted in zip(lines, result):
+        assert len(permuted.split()) == len(line.split())
+        for word, new in zip(line.split(), permuted.split()):
+            assert new == word if len(word) < 3 else new in swap_variants(word)
+
+
+def test_plan_cache():
+    """
+    Output is the same with and without plans, for any number of workers;
+    the cache keeps no more plans than its memory limit allows
+    :return:
+    """
+    rng = rd.Random(1)
+    vocabulary = [''.join(rng.choices('abcdefgh', k=rng.randint(1, 30))) for _ in range(50)]
+    text = '\n'.join(' '.join(rng.choices(vocabulary, k=rng.randint(0, 15))) for _ in range(300)) + '\n'
+    outputs = set()
+    for workers in (1, 2):
+        for cache_bytes in (0, 1 << 16):
+            dst = io.StringIO()
+            permute_corpus(io.StringIO(text), dst, workers=workers, chunk_size=256, cache_bytes=cache_bytes)
+            outputs.add(dst.getvalue())
+    assert len(outputs) == 1
+    cache = plan_cache(1 << 16)
+    for word in vocabulary * 2:
+        if 3 <= len(word) <= PLANNED_LENGTH:
+            assert cache(word) == swap_variants(word)
+    info = cache.cache_info()
+    assert 0 < info.maxsize < len(vocabulary) and info.currsize == info.maxsize and hit_rate(cache) < 1
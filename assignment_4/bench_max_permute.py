@@ -0,0 +1,99 @@
+"""
+Compare linear-time max_permute with the original nested scan: time and
+number of characters left in place, for natural-language-like words and
+long tokens (DNA-like strings, minified code). Then throughput of the word
+cache on Zipf-distributed text.
+
+Usage: `python3 bench_max_permute.py [max_length]`
+"""
+import random
+import string
+import sys
+import time
+from collections import Counter
+from max_permute import max_permute, cnt_unchanged, word_cache, hit_rate
+
+
+def max_permute_nested(s):
+    """
+    Original implementation: for every character scan the word for a place to swap, O(L^2)
+    :param s:
+    :return:
+    """
+    words = s.split()
+    for i, word in enumerate(words):
+        chars = list(word)
+        for j, c in enumerate(chars):
+            new_place = j
+            for k, cnew in zip(range(len(chars)), chars):
+                if cnew != c and cnew != word[j] and c != word[k]:
+                    new_place = k
+                    break
+            chars[new_place], chars[j] = chars[j], chars[new_place]
+        words[i] = ''.join(chars)
+    return ' '.join(words)
+
+
+def lower_bound(s):
+    """
+    Least possible number of characters left in place
+    :param s:
+    :return:
+    """
+    total = 0
+    for word in s.split():
+        m = max(Counter(word).values())
+        total += max(0, 2 * m - len(word))
+    return total
+
+
+def zipf_text(n_words, vocabulary=50000):
+    """
+    Text of n_words words, k-th most frequent word has frequency ~ 1/k
+    :param n_words:
+    :param vocabulary: number of distinct words
+    :return: str
+    """
+    words = [''.join(random.choices(string.ascii_lowercase, k=random.randint(2, 12))) for _ in range(vocabulary)]
+    weights = [1 / k for k in range(1, vocabulary + 1)]
+    return ' '.join(random.choices(words, weights, k=n_words))
+
+
+def timed(f, s):
+    start = time.perf_counter()
+    result = f(s)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    max_length = int(sys.argv[1]) if len(sys.argv) > 1 else 2 ** 20
+    random.seed(0)
+    inputs = [('words', ' '.join(''.join(random.choices(string.ascii_lowercase[:8], k=random.randint(1, 10)))
+                                 for _ in range(20000)))]
+    length = 256
+    while length <= max_length:
+        inputs.append((f'DNA, L={length}', ''.join(random.choices('ACGT', k=length))))
+        inputs.append((f'code, L={length}', ''.join(random.choices('(){};=.,aaaeeiioxy', k=length))))
+        length *= 16
+    print(f"{'input':<18}{'nested, s':>11}{'in place':>10}{'linear, s':>11}{'in place':>10}{'optimum':>9}")
+    for name, s in inputs:
+        if max(map(len, s.split())) <= 2 ** 14:  # the scan is quadratic in the length of a word
+            perm, t_nested = timed(max_permute_nested, s)
+            nested = f'{t_nested:>11.4f}{cnt_unchanged(s, perm):>10}'
+        else:  # quadratic scan takes too long
+            nested = f"{'-':>11}{'-':>10}"
+        perm, t_linear = timed(max_permute, s)
+        assert sorted(perm) == sorted(s)
+        print(f'{name:<18}{nested}{t_linear:>11.4f}{cnt_unchanged(s, perm):>10}{lower_bound(s):>9}')
+
+    text = zipf_text(10 ** 6)
+    mb = len(text) / 2 ** 20
+    print(f"\nZipf text, {mb:.1f} MB")
+    print(f"{'cache':<18}{'time, s':>11}{'MB/s':>10}{'hit rate':>10}{'words':>9}")
+    _, t = timed(lambda s: max_permute(s, cache=None), text)
+    print(f"{'none':<18}{t:>11.3f}{mb / t:>10.1f}")
+    for max_bytes in (1 << 16, 1 << 20, 1 << 26):
+        cache = word_cache(max_bytes)
+        _, t = timed(lambda s: max_permute(s, cache), text)
+        print(f"{f'{max_bytes >> 10} KB':<18}{t:>11.3f}{mb / t:>10.1f}{hit_rate(cache):>10.1%}"
+              f"{cache.cache_info().currsize:>9}")
@@ -1,26 +1,100 @@
+import re
+import sys
+from collections import Counter
+from functools import lru_cache
+from operator import eq
 
-def max_permute(s):
-    words = s.split()
-    for i, word in enumerate(words):
-        chars = list(word)
-        for j, c in enumerate(chars):
-            new_place = j
-            # iterate over word, find place for this char
-            for k, cnew in zip(range(len(chars)), chars):
-                # if new char is not old char, and new char is not in old place
-                # and cur char also not in new place, swap
-                if cnew != c and cnew != word[j] and c != word[k]:
-                    new_place = k
-                    break
-            chars[new_place], chars[j] = chars[j], chars[new_place]
-        words[i] = ''.join(chars)
-    return ' '.join(words)
+
+def permute_word(word):
+    """
+    Permutation of characters of the word leaving as few of them in place as
+    possible: max(0, 2m - len(word)), where m is the count of the most
+    frequent character (its copies beyond the other positions can't move).
+
+    Positions are grouped by character, most frequent first, and every
+    character moves m places forward in this order. A group of g <= m
+    positions can only come back onto itself if m + g > len(word), which
+    happens for the most frequent character only, exactly 2m - len(word) times.
+    Takes O(L + k log k) for k distinct characters.
+    :param word: str
+    :return: str
+    """
+    n = len(word)
+    if n < 2:
+        return word
+    counts = Counter(word)
+    chars = sorted(counts, key=counts.__getitem__, reverse=True)  # ties keep order of appearance
+    start = {}
+    pos = 0
+    for c in chars:
+        start[c] = pos
+        pos += counts[c]
+    order = [0] * n  # positions of the word grouped by character
+    for i, c in enumerate(word):
+        order[start[c]] = i
+        start[c] += 1
+    m = counts[chars[0]]
+    grouped = ''.join(c * counts[c] for c in chars)  # word[order[k]] for every k
+    result = [''] * n
+    for dst, c in zip(order[m:] + order[:m], grouped):
+        result[dst] = c
+    return ''.join(result)
+
+
+CACHED_LENGTH = 64  # longer tokens rarely repeat
+
+
+def word_cache(max_bytes=1 << 26):
+    """
+    Least recently used results of permute_word. Natural text repeats a few
+    thousand words over and over, so most of them are computed once. Words
+    longer than CACHED_LENGTH are not cached, which bounds the size of an
+    entry: key and result of 4-byte characters, plus lru_cache bookkeeping.
+    :param max_bytes: memory limit of the cache
+    :return: function of a word with cache_info() and cache_clear()
+    """
+    if max_bytes < 0:
+        raise ValueError(f"Cache size can't be negative: {max_bytes}")
+    entry = 2 * sys.getsizeof(chr(0x10000) * CACHED_LENGTH) + 200
+    return lru_cache(max_bytes // entry)(permute_word)
+
+
+def hit_rate(cache):
+    """
+    :param cache: function wrapped by lru_cache
+    :return: share of calls answered from the cache
+    """
+    info = cache.cache_info()
+    calls = info.hits + info.misses
+    return info.hits / calls if calls else 0.
+
+
+default_cache = word_cache()
+
+
+def max_permute(s, cache=default_cache):
+    """
+    :param s: text
+    :param cache: cache from word_cache(), None to compute every word
+    :return: permuted words joined by single spaces
+    """
+    if cache is None:
+        return ' '.join(map(permute_word, s.split()))
+    return ' '.join(cache(word) if len(word) <= CACHED_LENGTH else permute_word(word) for word in s.split())
+
+
+def _words(s):
+    """
+    Words of s one by one, without splitting the whole string
+    :param s:
+    :return: generator of str
+    """
+    return (m.group() for m in re.finditer(r'\S+', s))
 
 
 def cnt_unchanged(orig, perm):
-    return sum([1 if c_orig == c_perm else 0
-                for word_orig, word_perm in zip(orig.split(), perm.split())
-                for c_orig, c_perm in zip(word_orig, word_perm)])
+    return sum(sum(map(eq, word_orig, word_perm))
+               for word_orig, word_perm in zip(_words(orig), _words(perm)))
 
 
 if __name__ == '__main__':
@@ -28,3 +102,4 @@ if __name__ == '__main__':
     s_perm = max_permute(s)
     cnt = cnt_unchanged(s, s_perm)
     print(s_perm, cnt, sep='\n')
+    print(f"{default_cache.cache_info()}, hit rate {hit_rate(default_cache):.1%}", file=sys.stderr)
@@ -0,0 +1,20 @@
+import random as rd
+from collections import Counter
+from max_permute import max_permute, cnt_unchanged, word_cache
+
+
+def test_max_permute():
+    """
+    Every word is a permutation of itself with max(0, 2m - L) characters left
+    in place, m being the count of the most frequent character
+    :return:
+    """
+    rng = rd.Random(0)
+    words = [''.join(rng.choices('aabcdefg'[:rng.randint(1, 8)], k=rng.randint(1, 40))) for _ in range(2000)]
+    words += ['a', 'ab', 'aa', 'aab', 'abab', 'ACGT' * 300]
+    s = ' '.join(words)
+    for perm in (max_permute(s, cache=None), max_permute(s, word_cache(1 << 16))):
+        assert len(perm.split()) == len(words)
+        for word, new in zip(words, perm.split()):
+            assert sorted(new) == sorted(word)
+            assert cnt_unchanged(word, new) == max(0, 2 * max(Counter(word).values()) - len(word))